@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+
+# Prometheus exporter for HAProxy, installed on both proxies by site.yaml.
+#
+#   haproxy_exporter.py [--socket /run/haproxy/admin.sock] [--port 9101]
+#
+# Every scrape of /metrics sends "show info;show stat" to the admin socket in
+# one round trip and converts the answer, so the numbers are never older than
+# the scrape itself. Only the columns listed in STAT_METRICS are read from the
+# CSV; their positions are looked up once per scrape from the header line.
+
+import sys
+import time
+import socket
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# show stat "type" column
+FRONTEND, BACKEND, SERVER = '0', '1', '2'
+
+# CSV column -> (metric suffix, prometheus type, help, proxy types it applies to)
+STAT_METRICS = {
+    'qcur': ('queue_current', 'gauge', "Requests waiting in the queue", (BACKEND, SERVER)),
+    'qmax': ('queue_max', 'gauge', "Highest queue length seen", (BACKEND, SERVER)),
+    'scur': ('sessions_current', 'gauge', "Current sessions", (FRONTEND, BACKEND, SERVER)),
+    'smax': ('sessions_max', 'gauge', "Highest number of concurrent sessions", (FRONTEND, BACKEND, SERVER)),
+    'slim': ('sessions_limit', 'gauge', "Configured session limit", (FRONTEND, BACKEND, SERVER)),
+    'stot': ('sessions_total', 'counter', "Total sessions", (FRONTEND, BACKEND, SERVER)),
+    'rate': ('sessions_rate', 'gauge', "Sessions per second over the last second", (FRONTEND, BACKEND, SERVER)),
+    'bin': ('bytes_in_total', 'counter', "Bytes received", (FRONTEND, BACKEND, SERVER)),
+    'bout': ('bytes_out_total', 'counter', "Bytes sent", (FRONTEND, BACKEND, SERVER)),
+    'dreq': ('requests_denied_total', 'counter', "Requests denied by ACLs", (FRONTEND, BACKEND)),
+    'ereq': ('request_errors_total', 'counter', "Request errors", (FRONTEND,)),
+    'req_tot': ('http_requests_total', 'counter', "HTTP requests", (FRONTEND, BACKEND, SERVER)),
+    'econ': ('connection_errors_total', 'counter', "Failed connections to a server", (BACKEND, SERVER)),
+    'eresp': ('response_errors_total', 'counter', "Response errors", (BACKEND, SERVER)),
+    'wretr': ('retry_warnings_total', 'counter', "Connection retries", (BACKEND, SERVER)),
+    'wredis': ('redispatch_warnings_total', 'counter', "Requests redispatched to another server", (BACKEND, SERVER)),
+    'hrsp_2xx': ('http_responses_2xx_total', 'counter', "HTTP responses with a 2xx code", (FRONTEND, BACKEND, SERVER)),
+    'hrsp_4xx': ('http_responses_4xx_total', 'counter', "HTTP responses with a 4xx code", (FRONTEND, BACKEND, SERVER)),
+    'hrsp_5xx': ('http_responses_5xx_total', 'counter', "HTTP responses with a 5xx code", (FRONTEND, BACKEND, SERVER)),
+    'qtime': ('queue_time_average_seconds', 'gauge', "Average queue time over the last 1024 requests", (BACKEND, SERVER)),
+    'ctime': ('connect_time_average_seconds', 'gauge', "Average connect time over the last 1024 requests", (BACKEND, SERVER)),
+    'rtime': ('response_time_average_seconds', 'gauge', "Average response time over the last 1024 requests", (BACKEND, SERVER)),
+    'ttime': ('total_time_average_seconds', 'gauge', "Average total session time over the last 1024 requests", (BACKEND, SERVER)),
+    'weight': ('weight', 'gauge', "Effective weight", (BACKEND, SERVER)),
+    'act': ('active_servers', 'gauge', "Active servers in rotation", (BACKEND,)),
+    'bck': ('backup_servers', 'gauge', "Backup servers in rotation", (BACKEND,)),
+    'chkfail': ('check_failures_total', 'counter', "Failed health checks", (SERVER,)),
+    'check_duration': ('check_duration_seconds', 'gauge', "Duration of the last health check", (SERVER,)),
+}
+# HAProxy reports these in milliseconds
+MILLISECONDS = {'qtime', 'ctime', 'rtime', 'ttime', 'check_duration'}
+TYPE_NAMES = {FRONTEND: 'frontend', BACKEND: 'backend', SERVER: 'server'}
+
+# show info field -> (metric name, prometheus type, help)
+INFO_METRICS = {
+    'Uptime_sec': ('haproxy_process_uptime_seconds', 'gauge', "Seconds since HAProxy started"),
+    'CurrConns': ('haproxy_process_current_connections', 'gauge', "Current connections"),
+    'Maxconn': ('haproxy_process_max_connections', 'gauge', "Configured connection limit"),
+    'CumReq': ('haproxy_process_requests_total', 'counter', "Requests received since start"),
+    'ConnRate': ('haproxy_process_connection_rate', 'gauge', "Connections per second over the last second"),
+    'SessRate': ('haproxy_process_session_rate', 'gauge', "Sessions per second over the last second"),
+    'Run_queue': ('haproxy_process_run_queue', 'gauge', "Tasks in the run queue"),
+    'Idle_pct': ('haproxy_process_idle_ratio', 'gauge', "Fraction of time the process was idle"),
+}
+
+def query(socket_path, command, timeout):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(command.encode() + b"\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    return b"".join(chunks).decode()
+
+def split_output(output):
+    # "show info" comes first, "show stat" starts at its "# pxname,..." header
+    start = output.find("\n# ")
+    if start == -1:
+        return output, ""
+    return output[:start], output[start + 1:]
+
+def parse_info(text, samples):
+    for line in text.splitlines():
+        key, sep, value = line.partition(': ')
+        if sep and key in INFO_METRICS:
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            samples.setdefault(INFO_METRICS[key][0], []).append(('', number / 100 if key == 'Idle_pct' else number))
+
+def server_up(status):
+    # "UP", "UP 1/3", "no check" and "OPEN" (frontends) count as up; DOWN,
+    # MAINT, DRAIN and NOLB as out of rotation.
+    return 1 if status.startswith('UP') or status in ('no check', 'OPEN') else 0
+
+def parse_stat(text, samples):
+    lines = text.splitlines()
+    if not lines:
+        return
+    header = lines[0][2:].split(',')
+    position = {name: i for i, name in enumerate(header)}
+    type_index = position['type']
+    status_index = position['status']
+    columns = [(position[column], column) + STAT_METRICS[column] for column in STAT_METRICS if column in position]
+    for line in lines[1:]:
+        if not line:
+            continue
+        fields = line.split(',')
+        kind = fields[type_index]
+        if kind not in TYPE_NAMES:
+            continue
+        prefix = f"haproxy_{TYPE_NAMES[kind]}_"
+        if kind == SERVER:
+            labels = f'proxy="{fields[0]}",server="{fields[1]}"'
+        else:
+            labels = f'proxy="{fields[0]}"'
+        for index, column, suffix, _, _, kinds in columns:
+            value = fields[index]
+            if not value or kind not in kinds:
+                continue
+            number = float(value)
+            if column in MILLISECONDS:
+                number /= 1000
+            samples.setdefault(prefix + suffix, []).append((labels, number))
+        samples.setdefault(prefix + 'up', []).append((labels, server_up(fields[status_index])))
+
+def metric_meta():
+    meta = {name: (kind, text) for name, kind, text in INFO_METRICS.values()}
+    for suffix, kind, text, kinds in STAT_METRICS.values():
+        for proxy_type in kinds:
+            meta[f"haproxy_{TYPE_NAMES[proxy_type]}_{suffix}"] = (kind, text)
+    for proxy_type, name in TYPE_NAMES.items():
+        meta[f"haproxy_{name}_up"] = ('gauge', f"Whether the {name} is up and in rotation")
+    meta['haproxy_up'] = ('gauge', "Whether the last query of the admin socket succeeded")
+    meta['haproxy_exporter_scrape_duration_seconds'] = ('gauge', "Time spent querying and parsing the admin socket")
+    return meta
+
+METRIC_META = metric_meta()
+
+def format_value(value):
+    # Integral values (most counters) without exponent or trailing ".0"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def format_samples(samples):
+    lines = []
+    for name, values in samples.items():
+        kind, text = METRIC_META[name]
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in values:
+            lines.append(f"{name}{{{labels}}} {format_value(value)}" if labels else f"{name} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def collect(socket_path, timeout):
+    start = time.monotonic()
+    samples = {}
+    try:
+        info, stat = split_output(query(socket_path, "show info;show stat", timeout))
+        parse_info(info, samples)
+        parse_stat(stat, samples)
+        up = 1
+    except (OSError, KeyError, ValueError, IndexError) as e:
+        print(f"Querying {socket_path} failed: {e}", file=sys.stderr)
+        samples = {}
+        up = 0
+    samples['haproxy_up'] = [('', up)]
+    samples['haproxy_exporter_scrape_duration_seconds'] = [('', time.monotonic() - start)]
+    return format_samples(samples)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    socket_path = '/run/haproxy/admin.sock'
+    timeout = 5.0
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = collect(self.socket_path, self.timeout).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prometheus exporter for the HAProxy admin socket")
+    parser.add_argument('--socket', default='/run/haproxy/admin.sock')
+    parser.add_argument('--address', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9101)
+    parser.add_argument('--timeout', type=float, default=5.0, help="admin socket timeout in seconds")
+    args = parser.parse_args()
+    MetricsHandler.socket_path = args.socket
+    MetricsHandler.timeout = args.timeout
+    ThreadingHTTPServer((args.address, args.port), MetricsHandler).serve_forever()
@@ -7,6 +7,10 @@ import sys
 import openstack
 import subprocess
 from openstack import connection
+from inventory import server_metadata
+from server_groups import ensure_server_group, print_placement_report, scheduler_hints
+from lease import allocate_names, live_servers, scaling_lease
+from warm_pool import is_warm
 
 
 def run_command(command):
@@ -51,6 +55,18 @@ def create_keypair(conn, keypair_name, private_key_path):
         print(f"{current_date_time} Keypair {keypair_name} already exists.")
     return keypair.id
 
+def ensure_security_group_rule(conn, security_group, protocol, port, remote_ip_prefix):
+    rules = list(conn.network.security_group_rules(security_group_id=security_group.id, direction='ingress', protocol=protocol, port_range_min=port, port_range_max=port))
+    for rule in rules:
+        if rule.remote_ip_prefix == '0.0.0.0/0' and remote_ip_prefix != '0.0.0.0/0':
+            conn.network.delete_security_group_rule(rule)
+            print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Removed rule opening {protocol}/{port} to everyone.")
+    if any(rule.remote_ip_prefix == remote_ip_prefix for rule in rules):
+        return
+    conn.network.create_security_group_rule(
+        security_group_id=security_group.id, direction='ingress', protocol=protocol, port_range_min=port, port_range_max=port, remote_ip_prefix=remote_ip_prefix)
+    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Allowed {protocol}/{port} from {remote_ip_prefix} in {security_group.name}.")
+
 def setup_network(conn, tag_name, network_name, subnet_name, router_name, security_group_name):
     # Create network
     network = conn.network.find_network(network_name)
@@ -110,6 +126,9 @@ def setup_network(conn, tag_name, network_name, subnet_name, router_name, securi
     else:
         security_group = conn.network.find_security_group(security_group_name)
         print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Security group {security_group_name} already exists{security_group.id}")  
+    # The HAProxy exporter is only scraped from the bastion, so it is opened to
+    # the subnet only, and also on groups created before it existed.
+    ensure_security_group_rule(conn, security_group, 'tcp', 9101, subnet.cidr)
     return network_id, subnet_id
 
 def wait_for_active_state(server, retries=5, delay=30):
@@ -178,9 +197,12 @@ def get_floating_ip(addresses):
                 return address['addr']
     return None
 
-def create_servers(conn, server_name, port_name, image_id, flavor_id, keypair_name, security_group_id, network_id, floating_ip_required,existing_servers): 
+def create_servers(conn, server_name, port_name, image_id, flavor_id, keypair_name, security_group_id, network_id, floating_ip_required,existing_servers, metadata=None, hints=None, wait=True): 
     if server_name in existing_servers:
         server = conn.compute.find_server(server_name)
+        if metadata and not server.metadata:
+            # Tag servers created before roles were kept in metadata
+            conn.compute.set_server_metadata(server, **metadata)
         port = conn.network.find_port(port_name)
         fip = get_floating_ip(server.addresses) if floating_ip_required else None
         print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Server {server_name} already exists. {fip}, {port_name}")
@@ -190,7 +212,10 @@ def create_servers(conn, server_name, port_name, image_id, flavor_id, keypair_na
         port = conn.network.create_port(name=port_name, network_id=network_id,security_groups=[security_group_id])
         #print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Using security group: {security_group_id}")
         print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Created port {port.name} with ID {port.id}.")
-        server = conn.compute.create_server(name=server_name, image_id=image_id, flavor_id=flavor_id, key_name=keypair_name,networks=[{"port": port.id}])
+        server = conn.compute.create_server(name=server_name, image_id=image_id, flavor_id=flavor_id, key_name=keypair_name,networks=[{"port": port.id}], metadata=metadata or {}, scheduler_hints=hints or {})
+        if not wait:
+            # Caller waits for ACTIVE itself, e.g. after releasing the scaling lease
+            return server, None
 
         server = conn.compute.wait_for_server(server)
         print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Server {server.name}")
@@ -207,42 +232,48 @@ def create_servers(conn, server_name, port_name, image_id, flavor_id, keypair_na
             fip = None
         return server, fip
 
-def manage_dev_servers(conn, existing_servers, tag_name, image_id, flavor_id, keypair_name, security_group_name, network_id):
+def manage_dev_servers(conn, tag_name, image_id, flavor_id, keypair_name, security_group_name, network_id):
     dev_ips = {}
+    dev_hints = scheduler_hints(ensure_server_group(conn, tag_name, 'devservers'))
     dev_server = f"{tag_name}_dev"
     dev_port_name = f"{tag_name}_dev_port"
     required_dev_servers = 3
-    devservers_count = len([line for line in existing_servers.splitlines() if dev_server in line])
-    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Will need {required_dev_servers} node, launching them.")        
-    dev_servers = conn.compute.servers(details=True, all_projects=False, filters={"name": f"{dev_server}*"})
-    for server in dev_servers:
-        if network_id in server.addresses and server.addresses[network_id]:
-            internal_ip = server.addresses[network_id][0]['addr']
-            dev_ips[server.name] = internal_ip
-            print(f"Existing server {server.name} with IP {internal_ip} added to dev_ips")
-
-    if required_dev_servers > devservers_count:
-        devservers_to_add = required_dev_servers - devservers_count
-        sequence = devservers_count + 1
-        while devservers_to_add > 0:
-            devserver_name = f"{dev_server}{sequence}"
-            dev_port_n = f"{dev_port_name}{sequence}"
-            server, _ = create_servers(conn, devserver_name, dev_port_n, image_id, flavor_id, keypair_name, security_group_name, network_id, False, existing_servers)
+    created_servers = []
+    with scaling_lease(tag_name):
+        # Listed under the lease and in every state, so servers still building
+        # for a concurrent operate run are counted. Warm pool members are
+        # managed by operate and not counted here.
+        dev_servers = list(conn.compute.servers(details=True, all_projects=False, name=f"^{dev_server}"))
+        taken_names = [server.name for server in dev_servers]
+        dev_servers = [server for server in live_servers(dev_servers) if not is_warm(server)]
+        devservers_count = len(dev_servers)
+        print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Will need {required_dev_servers} node, launching them.")        
+        for server in dev_servers:
             if network_id in server.addresses and server.addresses[network_id]:
                 internal_ip = server.addresses[network_id][0]['addr']
-                dev_ips[devserver_name] = internal_ip
-            devservers_to_add -= 1
-            sequence += 1
-    elif required_dev_servers < devservers_count:
-        devservers_to_remove = devservers_count - required_dev_servers
-        servers = list(conn.compute.servers(details=True, status='ACTIVE', name=f"{tag_name}_dev"))
-        for _ in range(devservers_to_remove):
-            if servers:
-                server_to_delete = servers[0]
+                dev_ips[server.name] = internal_ip
+                print(f"Existing server {server.name} with IP {internal_ip} added to dev_ips")
+
+        if required_dev_servers > devservers_count:
+            # Only the create requests need the lease; once they are accepted
+            # the servers are listed (in BUILD) by any other run.
+            for devserver_name in allocate_names(dev_server, taken_names, required_dev_servers - devservers_count):
+                dev_port_n = f"{dev_port_name}{devserver_name[len(dev_server):]}"
+                server, _ = create_servers(conn, devserver_name, dev_port_n, image_id, flavor_id, keypair_name, security_group_name, network_id, False, taken_names, server_metadata(tag_name, 'devservers'), dev_hints, wait=False)
+                created_servers.append(server)
+        elif required_dev_servers < devservers_count:
+            for server_to_delete in dev_servers[:devservers_count - required_dev_servers]:
                 conn.compute.delete_server(server_to_delete.id)
                 print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Deleted {server_to_delete.name} server")
-    else:
-        print(f"Required number of dev servers({required_dev_servers}) already exist.")
+        else:
+            print(f"Required number of dev servers({required_dev_servers}) already exist.")
+
+    for server in created_servers:
+        server = conn.compute.wait_for_server(server)
+        print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Server {server.name}")
+        if network_id in server.addresses and server.addresses[network_id]:
+            internal_ip = server.addresses[network_id][0]['addr']
+            dev_ips[server.name] = internal_ip
     
     return dev_ips
 
@@ -342,21 +373,23 @@ def main(rc_file, tag_name, private_key):
     network_id, subnet_id = setup_network(conn, tag_name, network_name, subnet_name, router_name, security_group_name)   
     uuids = fetch_server_uuids(conn, "Ubuntu 20.04 Focal Fossa x86_64", "1C-2GB-50GB",security_group_name)
     existing_servers, _ = run_command("openstack server list --status ACTIVE --column Name -f value")
-    bastion_server, bastion_fip = create_servers(conn,bastion_name,bastion_port_name,uuids['image_id'],uuids['flavor_id'],keypair_name,uuids['security_group_id'],network_id,True,existing_servers)
-    haproxy_server, haproxy_fip = create_servers(conn, haproxy_name, haproxy_port_name, uuids['image_id'],uuids['flavor_id'],keypair_name,uuids['security_group_id'],network_id,True,existing_servers)
-    haproxy2_server, haproxy2_fip = create_servers(conn, haproxy2_name, haproxy2_port_name, uuids['image_id'],uuids['flavor_id'],keypair_name,uuids['security_group_id'],network_id,True,existing_servers)
+    proxy_hints = scheduler_hints(ensure_server_group(conn, tag_name, 'proxies'))
+    bastion_server, bastion_fip = create_servers(conn,bastion_name,bastion_port_name,uuids['image_id'],uuids['flavor_id'],keypair_name,uuids['security_group_id'],network_id,True,existing_servers, server_metadata(tag_name, 'bastion'))
+    haproxy_server, haproxy_fip = create_servers(conn, haproxy_name, haproxy_port_name, uuids['image_id'],uuids['flavor_id'],keypair_name,uuids['security_group_id'],network_id,True,existing_servers, server_metadata(tag_name, 'main_proxy'), proxy_hints)
+    haproxy2_server, haproxy2_fip = create_servers(conn, haproxy2_name, haproxy2_port_name, uuids['image_id'],uuids['flavor_id'],keypair_name,uuids['security_group_id'],network_id,True,existing_servers, server_metadata(tag_name, 'standby_proxy'), proxy_hints)
     fip_map = {
         bastion_name: bastion_fip,
         haproxy_name: haproxy_fip,
         haproxy2_name: haproxy2_fip
     }    
     generate_servers_ip_file(fip_map, "servers_fip")
-    manage_dev_servers(conn, existing_servers, tag_name, uuids['image_id'], uuids['flavor_id'], keypair_name, uuids["security_group_id"], network_id)
+    manage_dev_servers(conn, tag_name, uuids['image_id'], uuids['flavor_id'], keypair_name, uuids["security_group_id"], network_id)
     existing_ports = conn.network.ports()
     vip_port_haproxy2 = create_vip_port(conn, network_id, subnet_id, tag_name, haproxy2_server.id,uuids["security_group_id"] ,existing_ports)
     attach_port_to_server(conn, haproxy2_server.id, vip_port_haproxy2)
     vip_floating_ip_haproxy2 = assign_floating_ip_to_port(conn, vip_port_haproxy2)
     generate_vip_addresses_file(vip_floating_ip_haproxy2)
+    print_placement_report(conn, tag_name)
     #generate_configs(tag_name, private_key)    
     #print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Configuration files generated.")
     #time.sleep(40) 
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+import sys
+import json
+
+def read_timings(file_path):
+    entries = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+def summarize(entries):
+    tasks = {}
+    hosts = {}
+    for entry in entries:
+        key = (entry['play'], entry['task'])
+        task = tasks.setdefault(key, {'total': 0.0, 'max': 0.0, 'slowest_host': '', 'runs': 0})
+        task['total'] += entry['duration']
+        task['runs'] += 1
+        if entry['duration'] > task['max']:
+            task['max'] = entry['duration']
+            task['slowest_host'] = entry['host']
+        host = hosts.setdefault(entry['host'], {'total': 0.0, 'tasks': 0, 'failed': 0})
+        host['total'] += entry['duration']
+        host['tasks'] += 1
+        if entry['status'] in ('failed', 'unreachable'):
+            host['failed'] += 1
+    if entries:
+        wall = max(e['start'] + e['duration'] for e in entries) - min(e['start'] for e in entries)
+    else:
+        wall = 0.0
+    return tasks, hosts, wall
+
+def format_report(entries, top=10):
+    tasks, hosts, wall = summarize(entries)
+    lines = [f"Playbook wall time: {wall:.1f}s over {len(entries)} task results."]
+    # A task's cost to the run is its slowest host, since the default linear
+    # strategy waits for every host before moving on to the next task.
+    lines.append(f"Slowest {top} tasks (max per host / summed over hosts):")
+    slowest_tasks = sorted(tasks.items(), key=lambda item: item[1]['max'], reverse=True)[:top]
+    for (play, task), stats in slowest_tasks:
+        lines.append(f"  {stats['max']:7.1f}s {stats['total']:8.1f}s  [{play}] {task} (slowest on {stats['slowest_host']}, {stats['runs']} hosts)")
+    lines.append(f"Slowest {top} hosts (summed task time):")
+    slowest_hosts = sorted(hosts.items(), key=lambda item: item[1]['total'], reverse=True)[:top]
+    for host, stats in slowest_hosts:
+        failed = f", {stats['failed']} failed" if stats['failed'] else ""
+        lines.append(f"  {stats['total']:8.1f}s  {host} ({stats['tasks']} tasks{failed})")
+    return "\n".join(lines)
+
+def succeeded_hosts(file_path='ansible_timings.log', task=None):
+    # Hosts that finished the run without a failed or unreachable result and,
+    # if task is given, completed that task.
+    try:
+        entries = read_timings(file_path)
+    except FileNotFoundError:
+        return set()
+    failed = {e['host'] for e in entries if e['status'] in ('failed', 'unreachable')}
+    done = {e['host'] for e in entries if e['status'] == 'ok' and (task is None or e['task'] == task)}
+    return done - failed
+
+def print_report(file_path='ansible_timings.log', top=10):
+    try:
+        entries = read_timings(file_path)
+    except FileNotFoundError:
+        print(f"No timings recorded at {file_path}.")
+        return
+    print(format_report(entries, top))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        print("Usage: ansible_report.py [timings_log] [top_n]")
+        sys.exit(1)
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'ansible_timings.log'
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print_report(file_path, top)
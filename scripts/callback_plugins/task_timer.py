@@ -0,0 +1,82 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: task_timer
+    type: aggregate
+    short_description: Records how long every task took on every host
+    description:
+      - Writes one JSON object per task result to a log file, which
+        scripts/ansible_report.py turns into a slowest tasks/hosts report.
+    requirements:
+      - enable in configuration
+    options:
+      log_file:
+        description: File the timings are written to. It is truncated at the start of each playbook run.
+        default: ansible_timings.log
+        env:
+          - name: ANSIBLE_TASK_TIMER_LOG
+        ini:
+          - section: callback_task_timer
+            key: log_file
+'''
+
+import json
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'task_timer'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self._log = None
+        self._play = ''
+        self._starts = {}
+
+    def v2_playbook_on_start(self, playbook):
+        self._log = open(self.get_option('log_file'), 'w')
+
+    def v2_playbook_on_play_start(self, play):
+        self._play = play.get_name().strip()
+
+    def v2_runner_on_start(self, host, task):
+        self._starts[(host.get_name(), task._uuid)] = (time.time(), time.monotonic())
+
+    def _record(self, result, status):
+        host = result._host.get_name()
+        task = result._task
+        start = self._starts.pop((host, task._uuid), None)
+        if start is None or self._log is None:
+            return
+        entry = {
+            'play': self._play,
+            'task': task.get_name().strip(),
+            'host': host,
+            'status': status,
+            'start': start[0],
+            'duration': time.monotonic() - start[1],
+        }
+        self._log.write(json.dumps(entry) + '\n')
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, 'ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result, 'unreachable')
+
+    def v2_playbook_on_stats(self, stats):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -5,7 +5,11 @@ import argparse
 import datetime
 import openstack.exceptions
 import subprocess
+import shutil
 from contextlib import contextmanager
+from server_groups import delete_server_groups
+from lease import lease_path
+from inventory import cache_path
 
 def connect_to_openstack():
     return openstack.connect(
@@ -17,56 +21,41 @@ def connect_to_openstack():
         project_domain_name=os.getenv('OS_PROJECT_DOMAIN_NAME')
     )
 
-def delete_servers(conn, server_names, dev_server, devservers_count):
+def release_server(conn, server):
+    # Iterate over all addresses associated with the server
+    for network_name, address_list in server.addresses.items():
+        for address in address_list:
+            if address['OS-EXT-IPS:type'] == 'floating':
+                floating_ip = address['addr']
+                floating_ip_obj = conn.network.find_ip(floating_ip)
+                if floating_ip_obj:
+                    conn.network.delete_ip(floating_ip_obj)
+                    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Releasing floating IP {floating_ip} associated with {server.name}")
+                else:
+                    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Floating IP {floating_ip} not found")
+
+    # Delete the server after releasing the floating IP
+    conn.compute.delete_server(server)
+    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Releasing server {server.name}")
+
+def delete_servers(conn, server_names, dev_servers):
     for server_name in server_names:
         try:
             server = conn.compute.find_server(server_name)
             if server:
-                # Iterate over all addresses associated with the server
-                for network_name, address_list in server.addresses.items():
-                    for address in address_list:
-                        if address['OS-EXT-IPS:type'] == 'floating':
-                            floating_ip = address['addr']
-                            floating_ip_obj = conn.network.find_ip(floating_ip)
-                            if floating_ip_obj:
-                                conn.network.delete_ip(floating_ip_obj)
-                                print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Releasing floating IP {floating_ip} associated with {server_name}")
-                            else:
-                                print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Floating IP {floating_ip} not found")
-                
-                # Delete the server after releasing the floating IP
-                conn.compute.delete_server(server)
-                print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Releasing server {server_name}")
+                release_server(conn, server)
             else:
                 print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, {server_name} not found")
         except openstack.exceptions.ResourceNotFound:
             print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, {server_name} not found")
 
-    # Delete dev servers
-    for i in range(1, devservers_count + 1):
-        devserver_name = f"{dev_server}{i}"
+    # Delete dev servers: every one that exists, including numbering gaps,
+    # warm pool members and multi-create (_devbatch) instances
+    for server in dev_servers:
         try:
-            server = conn.compute.find_server(devserver_name)
-            if server:
-                # Iterate over all addresses associated with the server
-                for network_name, address_list in server.addresses.items():
-                    for address in address_list:
-                        if address['OS-EXT-IPS:type'] == 'floating':
-                            floating_ip = address['addr']
-                            floating_ip_obj = conn.network.find_ip(floating_ip)
-                            if floating_ip_obj:
-                                conn.network.delete_ip(floating_ip_obj)
-                                print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Releasing floating IP {floating_ip} associated with {devserver_name}")
-                            else:
-                                print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Floating IP {floating_ip} not found")
-                
-                # Delete the server after releasing the floating IP
-                conn.compute.delete_server(server)
-                print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Releasing server {devserver_name}")
-            else:
-                print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, {devserver_name} not found")
+            release_server(conn, server)
         except openstack.exceptions.ResourceNotFound:
-            print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, {devserver_name} not found")
+            print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, {server.name} not found")
 
 
 def delete_ports(conn, port_names):
@@ -153,13 +142,15 @@ def delete_files(tag_name):
     # List of files to delete
     config_file = os.path.expanduser("~/.ssh/config")
     known_hosts_file = os.path.expanduser("~/.ssh/known_hosts")
-    files_to_delete = ['servers_fip', 'vip_address', 'hosts','ansible.cfg', config_file,known_hosts_file]
+    files_to_delete = ['servers_fip', 'vip_address', 'hosts','ansible.cfg', 'ansible_timings.log', 'warm_pool_timings.log', 'warm_pool_provision.log', cache_path(tag_name), lease_path(tag_name), config_file,known_hosts_file]
     for file_name in files_to_delete:
         try:
             os.remove(file_name)
             print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')},Removing {file_name}")
         except FileNotFoundError:
             print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')},{file_name} not found")
+    shutil.rmtree('.ansible_facts', ignore_errors=True)
+    shutil.rmtree('rendered', ignore_errors=True)
 
 def cleanup_instances(conn, tag_name):
     network_name = f"{tag_name}_network"
@@ -170,14 +161,14 @@ def cleanup_instances(conn, tag_name):
     haproxy_server = f"{tag_name}_HAproxy"
     haproxy_server2 = f"{tag_name}_HAproxy2"
     bastion_server = f"{tag_name}_bastion"
-    dev_server = f"{tag_name}_dev"
-    devservers_count = len(list(conn.compute.servers(name=dev_server)))
+    dev_servers = list(conn.compute.servers(name=f"^{tag_name}_dev"))
     vip_port = f"{tag_name}_vip_port"
 
     print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')},$> cleanup {tag_name}")
     print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')},Cleaning up {tag_name} using myRC")
-    delete_servers(conn, [bastion_server, haproxy_server, haproxy_server2], dev_server, devservers_count)
+    delete_servers(conn, [bastion_server, haproxy_server, haproxy_server2], dev_servers)
     delete_ports(conn, [vip_port])
+    delete_server_groups(conn, tag_name)
     delete_router(conn, router_name)
     delete_subnets(conn, [subnet_name])
     delete_network(conn, network_name)
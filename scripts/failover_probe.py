@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+
+# Measures how long the VIP stays unavailable when HAProxy stops on the
+# keepalived MASTER.
+#
+#   DEPLOY_TAG=<tag> DEPLOY_SSH_KEY=<key> failover_probe.py
+#   failover_probe.py http://127.0.0.1:8080/ --trigger "kill <pid>" --restore ""
+#
+# The target is probed every --interval seconds with a fresh connection.
+# After --warmup seconds the --trigger command runs (by default: stop haproxy
+# on main_proxy), probing continues for --observe seconds, then --restore runs.
+# The outage window is the time from the first failed probe after the trigger
+# to the first successful probe after the last failure.
+
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+from inventory import INVENTORY_SCRIPT
+from loadgen import BACKEND_PATTERN, Connection, default_url, parse_target
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{timestamp} {message}", flush=True)
+
+def haproxy_command(state):
+    return f"ansible main_proxy -i {INVENTORY_SCRIPT} -b -m service -a 'name=haproxy state={state}'"
+
+async def probe(target, timeout, probes):
+    host, port, path = target
+    sent = time.monotonic()
+    connection = Connection(host, port, path, timeout)
+    try:
+        status, body = await connection.get()
+        match = BACKEND_PATTERN.search(body)
+        ok = status == 200
+        detail = match.group(2).decode() if match else f"HTTP {status}"
+    except asyncio.TimeoutError:
+        ok, detail = False, "timeout"
+    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+        ok, detail = False, type(e).__name__
+    finally:
+        await connection.close()
+    probes.append((sent, ok, detail))
+
+async def run_command(command):
+    if not command:
+        return None
+    process = await asyncio.create_subprocess_shell(command)
+    return await process.wait()
+
+async def measure(target, interval, timeout, warmup, observe, trigger, restore):
+    probes = []
+    tasks = set()
+    start = time.monotonic()
+    triggered_at = None
+    trigger_task = None
+    while time.monotonic() - start < warmup + observe:
+        if triggered_at is None and time.monotonic() - start >= warmup:
+            triggered_at = time.monotonic()
+            log(f"Triggering failover: {trigger}")
+            trigger_task = asyncio.ensure_future(run_command(trigger))
+        task = asyncio.ensure_future(probe(target, timeout, probes))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        await asyncio.sleep(interval)
+    if tasks:
+        await asyncio.wait(tasks)
+    if trigger_task is not None:
+        returncode = await trigger_task
+        if returncode:
+            log(f"Trigger command exited with {returncode}.")
+    if restore:
+        log(f"Restoring: {restore}")
+        await run_command(restore)
+    probes.sort()
+    return probes, triggered_at
+
+def outage_window(probes, triggered_at):
+    after = [p for p in probes if p[0] >= triggered_at]
+    failures = [p for p in after if not p[1]]
+    if not failures:
+        return None
+    first_failure = failures[0][0]
+    last_failure = failures[-1][0]
+    recovered = next((p[0] for p in after if p[0] > last_failure and p[1]), None)
+    return first_failure, last_failure, recovered, len(failures)
+
+def format_report(probes, triggered_at, interval):
+    before = [p for p in probes if p[0] < triggered_at]
+    lines = [f"{len(probes)} probes every {interval * 1000:.0f}ms, {sum(1 for p in before if not p[1])}/{len(before)} failed before the trigger."]
+    window = outage_window(probes, triggered_at)
+    if window is None:
+        lines.append("No failed probes after the trigger: failover was not visible to clients.")
+        return "\n".join(lines)
+    first_failure, last_failure, recovered, failed = window
+    lines.append(f"First failure {first_failure - triggered_at:.2f}s after the trigger, {failed} failed probes.")
+    if recovered is None:
+        lines.append(f"Still failing at the end of the run, outage lasted at least {last_failure - first_failure:.2f}s.")
+    else:
+        lines.append(f"Outage window: {recovered - first_failure:.2f}s (recovered {recovered - triggered_at:.2f}s after the trigger).")
+    served_by = {}
+    for sent, ok, detail in probes:
+        if ok:
+            key = 'before' if sent < triggered_at else 'after'
+            served_by.setdefault(key, set()).add(detail)
+    for key in ('before', 'after'):
+        if key in served_by:
+            lines.append(f"Backends {key} the trigger: {', '.join(sorted(served_by[key]))}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the VIP outage window during a HAProxy failover")
+    parser.add_argument('url', nargs='?', help="target URL, defaults to the VIP in ./vip_address on port 5000")
+    parser.add_argument('--interval', type=float, default=0.1, help="seconds between probes")
+    parser.add_argument('--timeout', type=float, default=0.5, help="per-probe timeout in seconds")
+    parser.add_argument('--warmup', type=float, default=5.0, help="seconds of probing before the trigger")
+    parser.add_argument('--observe', type=float, default=30.0, help="seconds of probing after the trigger")
+    parser.add_argument('--trigger', default=haproxy_command('stopped'), help="shell command that causes the failure")
+    parser.add_argument('--restore', default=haproxy_command('started'), help="shell command run afterwards, empty to skip")
+    args = parser.parse_args()
+    try:
+        url = args.url or default_url()
+    except FileNotFoundError:
+        print("No URL given and vip_address not found.")
+        sys.exit(1)
+    probes, triggered_at = asyncio.run(measure(parse_target(url), args.interval, args.timeout, args.warmup,
+                                               args.observe, args.trigger, args.restore))
+    print(f"Target: {url}")
+    print(format_report(probes, triggered_at, args.interval))
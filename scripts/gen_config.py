@@ -1,7 +1,19 @@
-import openstack
 import os
 import sys
 import subprocess
+import json
+from inventory import GROUPS, cached_servers
+from render_configs import RENDER_DIR, build_inventory, render_all, write_file_atomic
+
+FACT_CACHE_DIR = '.ansible_facts'
+TIMINGS_LOG = 'ansible_timings.log'
+FILE_SD_DIR = os.path.join(RENDER_DIR, 'file_sd')
+# role -> (port, service) for endpoints other than node_exporter that expose /metrics
+SERVICE_PORTS = {
+    'bastion': [(3000, 'grafana')],
+    'main_proxy': [(9101, 'haproxy')],
+    'standby_proxy': [(9101, 'haproxy')],
+}
 
 def run_command(command):
     process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
@@ -11,45 +23,8 @@ def run_command(command):
         sys.exit(1)
     return output.decode()
 
-def fetch_internal_ips(conn, tag_name):
-    servers = conn.compute.servers(details=True, all_projects=False, filters={"name": f"{tag_name}*"})
-    internal_ips = {}
-    
-    for server in servers:
-        server_name = server.name
-        networks = server.addresses
-        
-        for network_name, ip_list in networks.items():
-            for ip_info in ip_list:
-                ip_address = ip_info['addr']
-                # Check if IP is an internal IP (assuming internal IPs are in the range 10.x.x.x)
-                if ip_address.startswith('10.'):
-                    internal_ips[server_name] = ip_address
-                    
-    return internal_ips
-
-def read_fip_file(file_path):
-    fip_map = {}
-    with open(file_path, 'r') as f:
-        for line in f:
-            server_name, fip = line.strip().split(':')
-            fip_map[server_name] = fip
-            #add_to_known_hosts(fip)
-    return fip_map
-"""
-def add_to_known_hosts(ip_address):
-    command = f"ssh-keyscan -H {ip_address} >> ~/.ssh/known_hosts"
-    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return result
-"""
-
-def generate_ssh_config(internal_ips, fip_map, tag_name, key_path):
-    bastion_name = f"{tag_name}_bastion"
-    haproxy_server = f"{tag_name}_HAproxy"
-    haproxy_server2 = f"{tag_name}_HAproxy2"
-    bastion_fip = fip_map.get(bastion_name, "")
-    haproxy_fip1 = fip_map.get(haproxy_server, "")
-    haproxy_fip2 = fip_map.get(haproxy_server2, "")
+def generate_ssh_config(servers, tag_name, key_path):
+    bastion_name = next((server['name'] for server in servers if server['role'] == 'bastion'), f"{tag_name}_bastion")
     config_path = os.path.expanduser('~/.ssh/config')
 
     with open(config_path, 'w') as f:
@@ -64,77 +39,98 @@ def generate_ssh_config(internal_ips, fip_map, tag_name, key_path):
         f.write("\tControlPath ~/.ssh/ansible-%r@%h:%p\n")
         f.write("\tControlPersist yes\n\n")
 
-        if bastion_fip:
-            f.write(f"Host {bastion_name}\n")
-            f.write(f"\tHostName {bastion_fip}\n")
-        if haproxy_fip1:
-            f.write(f"Host {haproxy_server}\n")
-            f.write(f"\tHostName {haproxy_fip1}\n")
-            f.write(f"\tProxyJump {bastion_name}\n")
-        if haproxy_fip2:
-            f.write(f"Host {haproxy_server2}\n")
-            f.write(f"\tHostName {haproxy_fip2}\n")
-            f.write(f"\tProxyJump {bastion_name}\n")
-
-        for server_name, internal_ip in internal_ips.items():
-            if 'dev' in server_name:
-                f.write(f"Host {server_name}\n")
-                f.write(f"\tHostName {internal_ip}\n")
+        for server in servers:
+            if server['role'] == 'bastion':
+                if server['floating_ip']:
+                    f.write(f"Host {server['name']}\n")
+                    f.write(f"\tHostName {server['floating_ip']}\n")
+            elif server['role'] in ('main_proxy', 'standby_proxy'):
+                if server['floating_ip']:
+                    f.write(f"Host {server['name']}\n")
+                    f.write(f"\tHostName {server['floating_ip']}\n")
+                    f.write(f"\tProxyJump {bastion_name}\n")
+            else:
+                f.write(f"Host {server['name']}\n")
+                f.write(f"\tHostName {server['internal_ip']}\n")
                 f.write(f"\tProxyJump {bastion_name}\n")
 
-def generate_ansible_config(tag_name, fip_map, bastion_name, key_path):
+def generate_ansible_config(key_path, host_count):
+    # One fork per host so a whole cycle runs in a single wave, capped to keep
+    # the control node and the bastion jump from being flooded.
+    forks = min(max(5, host_count), 50)
 
     with open('ansible.cfg', 'w') as f:
         f.write("[defaults]\n")
-        f.write("inventory = hosts\n")
+        f.write("inventory = scripts/inventory.py\n")
         f.write("remote_user = ubuntu\n")
         f.write(f"private_key_file = {key_path}\n")
         f.write("host_key_checking = False\n")
-        f.write("control_path = ~/.ssh/ansible-%r@%h:%p\n")
-        f.write("control_master = auto\n")
-        f.write("control_persist = yes\n")
-        f.write("ssh_args = -o ForwardAgent=yes\n")
-        f.write(f"ansible_ssh_common_args = -o ProxyJump=ubuntu@{fip_map.get(bastion_name, '')} -o IdentityFile={key_path}\n")
-
-def generate_host_file(internal_ips, fip_map, tag_name, key_path):
-    bastion_name = f"{tag_name}_bastion"
-    haproxy_server = f"{tag_name}_HAproxy"
-    haproxy_server2 = f"{tag_name}_HAproxy2"
-
-    with open('hosts', 'w') as f:
-        f.write("[bastion]\n")
-        if bastion_name in internal_ips:
-            f.write(f"{bastion_name} ansible_host={fip_map.get(bastion_name, '')} ansible_user=ubuntu ansible_ssh_private_key_file={key_path}\n\n")
-
-        f.write("[main_proxy]\n")
-        if haproxy_server in internal_ips:
-            f.write(f"{haproxy_server} ansible_host={fip_map.get(haproxy_server, '')} ansible_user=ubuntu ansible_ssh_private_key_file={key_path} ansible_ssh_common_args='-o ProxyJump=ubuntu@{fip_map.get(bastion_name, '')} -i {key_path}'\n")
-        
-        f.write("\n[standby_proxy]\n")
-        if haproxy_server2 in internal_ips:
-            f.write(f"{haproxy_server2} ansible_host={fip_map.get(haproxy_server2, '')} ansible_user=ubuntu ansible_ssh_private_key_file={key_path} ansible_ssh_common_args='-o ProxyJump=ubuntu@{fip_map.get(bastion_name, '')} -i {key_path}'\n")
-
-        f.write("\n[devservers]\n")
-        for server_name, internal_ip in internal_ips.items():
-            if 'dev' in server_name:
-                f.write(f"{server_name} ansible_host={internal_ip} ansible_user=ubuntu ansible_ssh_private_key_file={key_path} ansible_ssh_common_args='-o ProxyJump=ubuntu@{fip_map.get(bastion_name, '')} -i {key_path}'\n")
+        f.write(f"forks = {forks}\n")
+        f.write("gathering = smart\n")
+        f.write("fact_caching = jsonfile\n")
+        f.write(f"fact_caching_connection = {FACT_CACHE_DIR}\n")
+        f.write("fact_caching_timeout = 3600\n")
+        f.write("callback_plugins = scripts/callback_plugins\n")
+        f.write("callbacks_enabled = task_timer\n\n")
+        f.write("[callback_task_timer]\n")
+        f.write(f"log_file = {TIMINGS_LOG}\n\n")
+        f.write("[ssh_connection]\n")
+        f.write("pipelining = True\n")
+        f.write("control_path = ~/.ssh/ansible-%%r@%%h:%%p\n")
+        f.write("ssh_args = -o ControlMaster=auto -o ControlPersist=yes -o ForwardAgent=yes\n")
+
+def prune_fact_cache(internal_ips, cache_dir=FACT_CACHE_DIR):
+    # Cached facts are keyed by inventory name, so a dev server that was deleted
+    # and recreated under the same name would otherwise keep its old address.
+    if not os.path.isdir(cache_dir):
+        return
+    for host in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, host)
+        try:
+            with open(path, 'r') as f:
+                cached_ip = json.load(f).get('ansible_default_ipv4', {}).get('address')
+        except (OSError, ValueError):
+            cached_ip = None
+        if host not in internal_ips or cached_ip != internal_ips[host]:
+            os.remove(path)
+            print(f"Dropped stale cached facts for {host}.")
+
+def generate_file_sd_targets(servers, out_dir=FILE_SD_DIR):
+    # Prometheus scrapes from the bastion, so internal addresses are used for
+    # every host. Files are replaced atomically so Prometheus never reads a
+    # half-written target list.
+    groups, hostvars = build_inventory(servers)
+    node_targets = []
+    service_targets = []
+    for role in GROUPS:
+        for host in groups[role]:
+            internal_ip = hostvars[host]['ansible_default_ipv4']['address']
+            node_targets.append({'targets': [f"{internal_ip}:9100"], 'labels': {'instance': host, 'role': role}})
+            for port, service in SERVICE_PORTS.get(role, []):
+                service_targets.append({'targets': [f"{internal_ip}:{port}"], 'labels': {'instance': host, 'role': role, 'service': service}})
+    os.makedirs(out_dir, exist_ok=True)
+    write_file_atomic(os.path.join(out_dir, 'node_exporter.json'), json.dumps(node_targets, indent=2, sort_keys=True) + "\n")
+    write_file_atomic(os.path.join(out_dir, 'services.json'), json.dumps(service_targets, indent=2, sort_keys=True) + "\n")
 
 def main(tag_name, key_path):
     print(f"Received tag_name: {tag_name}, key_path: {key_path}")
     
-    # Establish connection with OpenStack
-    conn = openstack.connect()
-
-    internal_ips = fetch_internal_ips(conn, tag_name)
-    fip_map = read_fip_file('servers_fip')
+    # Same listing (and role metadata) as the dynamic inventory; ttl=0 forces
+    # a fresh one and leaves it cached for the ansible runs that follow.
+    servers = cached_servers(tag_name, ttl=0)
+    internal_ips = {server['name']: server['internal_ip'] for server in servers}
+    fip_map = {server['name']: server['floating_ip'] for server in servers if server['floating_ip']}
     print("Internal IPs:", internal_ips)
     print("Floating IPs:", fip_map)
-    generate_ssh_config(internal_ips, fip_map, tag_name, key_path)
+    generate_ssh_config(servers, tag_name, key_path)
     print("Generated SSH config.")
-    #generate_ansible_config(tag_name, fip_map, f"{tag_name}_bastion", key_path)
+    generate_ansible_config(key_path, len(internal_ips))
+    prune_fact_cache(internal_ips)
     print("Generated Ansible config.")
-    generate_host_file(internal_ips, fip_map, tag_name, key_path)
-    print("Generated hosts file.")
+    render_all(servers)
+    print("Rendered haproxy, nginx and prometheus configs.")
+    generate_file_sd_targets(servers)
+    print("Generated Prometheus file_sd targets.")
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
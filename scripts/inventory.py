@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+
+# Ansible dynamic inventory for one deployment tag.
+#
+#   DEPLOY_TAG=<tag> DEPLOY_SSH_KEY=<private_key> inventory.py --list
+#
+# Servers are listed from OpenStack and grouped by their 'role' metadata. The
+# listing is cached for INVENTORY_CACHE_TTL seconds (default 30) so the many
+# inventory calls of one operate cycle cost a single API round trip.
+
+import os
+import re
+import json
+import time
+import argparse
+
+INVENTORY_SCRIPT = os.path.abspath(__file__)
+GROUPS = ('bastion', 'main_proxy', 'standby_proxy', 'devservers')
+DEFAULT_CACHE_TTL = 30
+# Warm pool membership (see warm_pool.py); kept here because both the
+# inventory and the rendered haproxy.cfg decide rotation from it
+POOL_KEY = 'pool'
+WARM = 'warm'
+
+def cache_path(tag_name):
+    return f".inventory_cache_{tag_name}.json"
+
+def invalidate_cache(tag_name):
+    try:
+        os.remove(cache_path(tag_name))
+    except FileNotFoundError:
+        pass
+
+def server_metadata(tag_name, role):
+    return {'deploy_tag': tag_name, 'role': role}
+
+def in_rotation(metadata):
+    return metadata.get(POOL_KEY) != WARM
+
+def legacy_role(server_name, tag_name):
+    # Servers created before roles were recorded in metadata
+    if server_name == f"{tag_name}_bastion":
+        return 'bastion'
+    if server_name == f"{tag_name}_HAproxy":
+        return 'main_proxy'
+    if server_name == f"{tag_name}_HAproxy2":
+        return 'standby_proxy'
+    if re.fullmatch(rf"{re.escape(tag_name)}_dev\d+", server_name):
+        return 'devservers'
+    return None
+
+def get_addresses(server_addresses):
+    internal_ip = None
+    floating_ip = None
+    for network_name, address_list in server_addresses.items():
+        for address in address_list:
+            if address.get('OS-EXT-IPS:type') == 'floating':
+                floating_ip = address['addr']
+            elif internal_ip is None:
+                internal_ip = address['addr']
+    return internal_ip, floating_ip
+
+def list_servers(conn, tag_name):
+    servers = []
+    for server in conn.compute.servers(details=True, name=f"^{tag_name}_"):
+        metadata = server.metadata or {}
+        if metadata.get('deploy_tag', tag_name) != tag_name:
+            continue
+        if server.name.startswith(f"{tag_name}_devbatch"):
+            # Still being renamed by a scale-up in operate.py
+            continue
+        role = metadata.get('role') or legacy_role(server.name, tag_name)
+        if role not in GROUPS:
+            continue
+        internal_ip, floating_ip = get_addresses(server.addresses or {})
+        if internal_ip is None:
+            continue
+        servers.append({
+            'name': server.name,
+            'role': role,
+            'internal_ip': internal_ip,
+            'floating_ip': floating_ip,
+            'metadata': dict(metadata),
+        })
+    servers.sort(key=lambda s: s['name'])
+    return servers
+
+def cached_servers(tag_name, ttl=None):
+    if ttl is None:
+        ttl = int(os.getenv('INVENTORY_CACHE_TTL', DEFAULT_CACHE_TTL))
+    path = cache_path(tag_name)
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+        if time.time() - cache['timestamp'] < ttl:
+            return cache['servers']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    import openstack
+    servers = list_servers(openstack.connect(), tag_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'timestamp': time.time(), 'servers': servers}, f)
+    os.replace(tmp_path, path)
+    return servers
+
+def build_inventory(servers, key_path):
+    inventory = {group: {'hosts': []} for group in GROUPS}
+    inventory['warm_pool'] = {'hosts': []}
+    inventory['_meta'] = {'hostvars': {}}
+    bastion_fip = next((s['floating_ip'] for s in servers if s['role'] == 'bastion' and s['floating_ip']), '')
+    for server in servers:
+        hostvars = {
+            'ansible_user': 'ubuntu',
+            'ansible_ssh_private_key_file': key_path,
+            'ansible_host': server['floating_ip'] or server['internal_ip'],
+            'internal_ip': server['internal_ip'],
+        }
+        if server['role'] != 'bastion':
+            hostvars['ansible_ssh_common_args'] = f"-o ProxyJump=ubuntu@{bastion_fip} -i {key_path}"
+        if server['role'] == 'devservers':
+            # Warm pool members are provisioned with the rest but kept out of HAProxy
+            hostvars['in_rotation'] = in_rotation(server['metadata'])
+            if not hostvars['in_rotation']:
+                inventory['warm_pool']['hosts'].append(server['name'])
+        inventory[server['role']]['hosts'].append(server['name'])
+        inventory['_meta']['hostvars'][server['name']] = hostvars
+    return inventory
+
+def get_inventory(tag_name=None, key_path=None):
+    tag_name = tag_name or os.getenv('DEPLOY_TAG')
+    key_path = key_path or os.getenv('DEPLOY_SSH_KEY', '~/.ssh/id_rsa')
+    if not tag_name:
+        raise SystemExit("DEPLOY_TAG is not set.")
+    return build_inventory(cached_servers(tag_name), key_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--list', action='store_true')
+    parser.add_argument('--host')
+    args = parser.parse_args()
+    inventory = get_inventory()
+    if args.host:
+        print(json.dumps(inventory['_meta']['hostvars'].get(args.host, {})))
+    else:
+        print(json.dumps(inventory, indent=2))
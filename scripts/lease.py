@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+# Per-tag scaling lease shared by install (Deploy.py) and operate.
+#
+# Both run from this checkout, so the lease is an flock on
+# .scaling_<tag>.lock: it serialises the list -> decide -> boot/delete step
+# of every scaling action, and the kernel drops it if the holder dies, so a
+# crashed run never leaves a stale lease behind. Whoever holds it writes its
+# pid into the file so a waiting run can say what it is waiting for.
+#
+# Inside the lease the server list is re-read and new names fill the gaps in
+# the observed set, which makes repeated or concurrent runs converge on the
+# required count instead of booting duplicates.
+
+import os
+import re
+import sys
+import time
+import fcntl
+import datetime
+import contextlib
+
+LEASE_TIMEOUT = 900
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{timestamp} {message}")
+
+def lease_path(tag_name):
+    return f".scaling_{tag_name}.lock"
+
+def lease_holder(lock_file):
+    lock_file.seek(0)
+    return lock_file.read().strip() or "another process"
+
+@contextlib.contextmanager
+def scaling_lease(tag_name, timeout=LEASE_TIMEOUT, interval=2):
+    path = lease_path(tag_name)
+    # 'a+' so opening the file does not wipe the current holder's note
+    with open(path, 'a+') as lock_file:
+        deadline = time.monotonic() + timeout
+        waiting = False
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Scaling lease {path} still held by {lease_holder(lock_file)} after {timeout}s")
+                if not waiting:
+                    log(f"Waiting for the scaling lease held by {lease_holder(lock_file)}...")
+                    waiting = True
+                time.sleep(interval)
+        lock_file.truncate(0)
+        lock_file.write(f"pid {os.getpid()} ({os.path.basename(sys.argv[0])}) since {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        lock_file.flush()
+        try:
+            yield
+        finally:
+            lock_file.truncate(0)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def live_servers(servers):
+    # Servers already being deleted must not count towards the required
+    # number, or a concurrent scale-down would remove one too many.
+    return [server for server in servers if server.status != 'DELETED' and server.task_state != 'deleting']
+
+def allocate_names(prefix, existing_names, count):
+    pattern = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+    used = {int(match.group(1)) for match in map(pattern.match, existing_names) if match}
+    names = []
+    index = 1
+    while len(names) < count:
+        if index not in used:
+            names.append(f"{prefix}{index}")
+        index += 1
+    return names
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: lease.py <tag_name>")
+        sys.exit(1)
+    with open(lease_path(sys.argv[1]), 'a+') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            print("Scaling lease is free.")
+        except BlockingIOError:
+            print(f"Scaling lease is held by {lease_holder(lock_file)}.")
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+
+# HTTP load generator for the VIP -> HAProxy -> gunicorn path.
+#
+#   loadgen.py                               # http://<vip_address>:5000/, closed loop
+#   loadgen.py http://127.0.0.1:5000/ --mode open --rate 200 --duration 60
+#
+# Closed loop keeps --concurrency requests in flight and measures what the
+# stack can sustain. Open loop sends --rate requests per second regardless of
+# how fast responses come back; latency is then measured from the time each
+# request was due, so queueing under overload shows up in the tail.
+
+import re
+import sys
+import time
+import random
+import asyncio
+import argparse
+import urllib.parse
+
+# service.py answers "<time> <client>:<port> -- <ip> (<hostname>) <rand>"
+BACKEND_PATTERN = re.compile(rb" -- (\S+) \(([^)]*)\)")
+PERCENTILES = (50, 90, 99, 99.9)
+
+def default_url(vip_file='vip_address', port=5000):
+    with open(vip_file, 'r') as f:
+        return f"http://{f.read().strip()}:{port}/"
+
+class Connection:
+    def __init__(self, host, port, path, timeout):
+        self.host = host
+        self.port = port
+        self.request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: keep-alive\r\n\r\n".encode()
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def _get(self):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(self.request)
+        await self.writer.drain()
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = None
+        keep_alive = head.startswith(b"HTTP/1.1")
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"connection":
+                keep_alive = value.strip().lower() == b"keep-alive"
+        if length is None:
+            body = await self.reader.read()
+            keep_alive = False
+        else:
+            body = await self.reader.readexactly(length)
+        # gunicorn's sync workers and the Flask dev server close after every
+        # response, so connections are reopened transparently.
+        if not keep_alive:
+            await self.close()
+        return status, body
+
+    async def get(self):
+        try:
+            return await asyncio.wait_for(self._get(), self.timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self.backends = {}
+
+    def record(self, latency, status, body):
+        if status != 200:
+            self.error(f"HTTP {status}")
+            return
+        self.latencies.append(latency)
+        match = BACKEND_PATTERN.search(body)
+        backend = match.group(2).decode() if match else 'unknown'
+        self.backends[backend] = self.backends.get(backend, 0) + 1
+
+    def error(self, reason):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def histogram(sorted_values):
+    # Log-spaced buckets (1, 2, 5 per decade) starting at 100us
+    edges = []
+    edge = 0.0001
+    while not edges or edges[-1] < sorted_values[-1]:
+        edges.extend((edge, edge * 2, edge * 5))
+        edge *= 10
+    counts = [0] * len(edges)
+    i = 0
+    for value in sorted_values:
+        while value > edges[i]:
+            i += 1
+        counts[i] += 1
+    return [(edges[i], counts[i]) for i in range(len(edges)) if counts[i]]
+
+def format_report(results, elapsed, mode):
+    latencies = sorted(results.latencies)
+    total_errors = sum(results.errors.values())
+    lines = [f"{mode} loop: {len(latencies)} ok, {total_errors} errors in {elapsed:.1f}s ({len(latencies) / elapsed:.1f} req/s)"]
+    if latencies:
+        summary = ", ".join(f"p{pct:g} {percentile(latencies, pct) * 1000:.1f}ms" for pct in PERCENTILES)
+        lines.append(f"Latency: {summary}, max {latencies[-1] * 1000:.1f}ms")
+        lines.append("Histogram:")
+        buckets = histogram(latencies)
+        peak = max(count for _, count in buckets)
+        for edge, count in buckets:
+            lines.append(f"  <= {edge * 1000:9.1f}ms {count:8d} {'#' * max(1, count * 40 // peak)}")
+    if results.backends:
+        lines.append("Backends:")
+        served = sum(results.backends.values())
+        for backend, count in sorted(results.backends.items()):
+            lines.append(f"  {backend:24} {count:8d} {count * 100 / served:5.1f}%")
+    for reason, count in sorted(results.errors.items()):
+        lines.append(f"Error {reason}: {count}")
+    return "\n".join(lines)
+
+async def timed_get(connection, results, due):
+    try:
+        status, body = await connection.get()
+    except asyncio.TimeoutError:
+        results.error("timeout")
+    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+        results.error(type(e).__name__)
+    else:
+        results.record(time.monotonic() - due, status, body)
+
+async def closed_loop(target, concurrency, duration, timeout, results):
+    host, port, path = target
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        connection = Connection(host, port, path, timeout)
+        while time.monotonic() < deadline:
+            await timed_get(connection, results, time.monotonic())
+        await connection.close()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+async def open_loop(target, rate, duration, timeout, max_connections, poisson, results):
+    host, port, path = target
+    idle = []
+    in_flight = set()
+    limit = asyncio.Semaphore(max_connections)
+
+    async def send(due):
+        async with limit:
+            connection = idle.pop() if idle else Connection(host, port, path, timeout)
+            await timed_get(connection, results, due)
+            idle.append(connection)
+
+    start = time.monotonic()
+    due = start
+    while due < start + duration:
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(send(due))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        due += random.expovariate(rate) if poisson else 1 / rate
+    if in_flight:
+        await asyncio.wait(in_flight)
+    for connection in idle:
+        await connection.close()
+
+def parse_target(url):
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme != 'http':
+        raise SystemExit(f"Only http:// targets are supported, got {url}")
+    path = parsed.path or '/'
+    if parsed.query:
+        path += '?' + parsed.query
+    return parsed.hostname, parsed.port or 80, path
+
+def run(url, mode='closed', concurrency=10, rate=100.0, duration=30.0, timeout=5.0, max_connections=256, poisson=False):
+    target = parse_target(url)
+    results = Results()
+    start = time.monotonic()
+    if mode == 'closed':
+        asyncio.run(closed_loop(target, concurrency, duration, timeout, results))
+    else:
+        asyncio.run(open_loop(target, rate, duration, timeout, max_connections, poisson, results))
+    return results, time.monotonic() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load generator for the deployed service")
+    parser.add_argument('url', nargs='?', help="target URL, defaults to the VIP in ./vip_address on port 5000")
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--concurrency', type=int, default=10, help="requests in flight (closed loop)")
+    parser.add_argument('--rate', type=float, default=100.0, help="requests per second (open loop)")
+    parser.add_argument('--poisson', action='store_true', help="exponential inter-arrival times (open loop)")
+    parser.add_argument('--max-connections', type=int, default=256, help="connection cap (open loop)")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds")
+    parser.add_argument('--timeout', type=float, default=5.0, help="per-request timeout in seconds")
+    args = parser.parse_args()
+    try:
+        url = args.url or default_url()
+    except FileNotFoundError:
+        print("No URL given and vip_address not found.")
+        sys.exit(1)
+    results, elapsed = run(url, args.mode, args.concurrency, args.rate, args.duration, args.timeout,
+                           args.max_connections, args.poisson)
+    print(f"Target: {url}")
+    print(format_report(results, elapsed, args.mode))
@@ -1,10 +1,24 @@
 #!/usr/bin/python3
 
+import os
 import sys
 import time
 import datetime
 import openstack
 import subprocess
+from ssh_ready import inventory_targets, wait_for_hosts
+from inventory import INVENTORY_SCRIPT, get_inventory, invalidate_cache, server_metadata
+from ansible_report import print_report, succeeded_hosts
+from render_configs import push_changed_configs
+from server_groups import ensure_server_group, print_placement_report, scheduler_hints
+from lease import allocate_names, live_servers, scaling_lease
+from warm_pool import PoolStats, PROVISIONED_TASK, WARM, POOL_KEY, demote_servers, is_ready, is_warm, mark_provisioned, promote_servers, read_pool_size, start_provisioning, unprovisioned_members
+
+IMAGE_NAME = 'Ubuntu 20.04 Focal Fossa x86_64'
+FLAVOR_NAME = '1C-2GB-50GB'
+# A cycle waits this long for new hosts; hosts that are still not reachable
+# are left out of the playbook run and probed again next cycle.
+SSH_TIMEOUT = 120
 
 def run_command(command):
     result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -35,49 +49,131 @@ def get_network_parameters(conn, tag_name):
 
     return network, subnet, router, security_group, keypair_name
 
-def manage_dev_servers(conn, existing_servers, tag_name, keypair_name, network, security_group, required_dev_servers):
+def batch_index(server_name):
+    # A single-instance request keeps the plain batch name
+    suffix = server_name.rsplit('-', 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+def boot_dev_servers(conn, tag_name, names, keypair_name, network, security_group, metadata=None):
+    # Image and flavor are resolved once and the whole batch is booted with a
+    # single multi-create request. Nova names the instances <name>-1..N, so
+    # they are listed back by that unique batch name and renamed in order.
+    image = conn.compute.find_image(IMAGE_NAME)
+    flavor = conn.compute.find_flavor(FLAVOR_NAME)
+    if not image or not flavor:
+        log(f"Image {IMAGE_NAME} or flavor {FLAVOR_NAME} not found, cannot create dev servers.")
+        return []
+    group = ensure_server_group(conn, tag_name, 'devservers')
+    batch_name = f"{tag_name}_devbatch{int(time.time())}"
+    log(f"Creating {len(names)} dev servers in one request as {batch_name}...")
+    conn.compute.create_server(
+        name=batch_name, image_id=image.id, flavor_id=flavor.id, networks=[{"uuid": network.id}],
+        security_groups=[{"name": security_group.name}], key_name=keypair_name,
+        metadata=metadata or server_metadata(tag_name, 'devservers'), min_count=len(names), max_count=len(names),
+        scheduler_hints=scheduler_hints(group)
+    )
+    batch = list(conn.compute.servers(details=True, name=f"^{batch_name}"))
+    batch.sort(key=lambda server: batch_index(server.name))
+    created_servers = []
+    for server, devserver_name in zip(batch, names):
+        server = conn.compute.update_server(server, name=devserver_name)
+        created_servers.append(server)
+        log(f"Server {devserver_name} created successfully.")
+    return created_servers
+
+def manage_dev_servers(conn, existing_servers, tag_name, keypair_name, network, security_group, required_dev_servers, pool_size=0, pool_stats=None):
     dev_server_prefix = f"{tag_name}_dev"
+    created_servers = []
+    pool_stats = pool_stats or PoolStats()
     
     if not existing_servers:
         log("No servers retrieved from OpenStack. Please check the connection and server details.")
-        return
+        return created_servers
     existing_servers = list(existing_servers)  # Ensure it is a list
-    devservers_count = len([server for server in existing_servers if server.name.startswith(dev_server_prefix)])
-    log(f"Current number of dev servers: {devservers_count}")
+    dev_servers = [server for server in existing_servers if server.name.startswith(dev_server_prefix)]
+    # Names of servers still being deleted stay reserved until they are gone
+    taken_names = [server.name for server in dev_servers]
+    dev_servers = live_servers(dev_servers)
+    for server in dev_servers:
+        if server.name.startswith(f"{tag_name}_devbatch"):
+            # Left unnamed by a scale-up that was interrupted before renaming
+            name = allocate_names(dev_server_prefix, taken_names, 1)[0]
+            log(f"Adopting {server.name} as {name}.")
+            conn.compute.update_server(server, name=name)
+            server.name = name
+            taken_names.append(name)
+    warm_servers = [server for server in dev_servers if is_warm(server)]
+    active_servers = [server for server in dev_servers if not is_warm(server)]
+    devservers_count = len(active_servers)
+    log(f"Current number of dev servers: {devservers_count} (+{len(warm_servers)} in the warm pool)")
     
     if required_dev_servers > devservers_count:
         devservers_to_add = required_dev_servers - devservers_count
         log(f"Need to add {devservers_to_add} dev servers.")
-        
-
-        for i in range(devservers_count + 1, devservers_count + devservers_to_add + 1):
-            devserver_name = f"{dev_server_prefix}{i}"
-            log(f"Creating server {devserver_name}...")
-            conn.compute.create_server(
-                name=devserver_name,image_id=conn.compute.find_image('Ubuntu 20.04 Focal Fossa x86_64').id,flavor_id=conn.compute.find_flavor('1C-2GB-50GB').id,networks=[{"uuid": network.id}],
-                security_groups=[{"name": security_group.name}],key_name=keypair_name
-            )
-            log(f"Server {devserver_name} created successfully.")
+        promoted = promote_servers(conn, [server for server in warm_servers if is_ready(server)][:devservers_to_add], pool_stats)
+        warm_servers = [server for server in warm_servers if server not in promoted]
+        devservers_to_add -= len(promoted)
+        if devservers_to_add > 0:
+            names = allocate_names(dev_server_prefix, taken_names, devservers_to_add)
+            taken_names += names
+            created_servers = boot_dev_servers(conn, tag_name, names, keypair_name, network, security_group)
+            pool_stats.record_cold_boots(devservers_to_add)
+        log(pool_stats.report())
     
     elif required_dev_servers < devservers_count:
         devservers_to_remove = devservers_count - required_dev_servers
         log(f"Need to remove {devservers_to_remove} dev servers.")
+        # Surplus nodes refill the pool first, the rest are deleted. Only nodes
+        # that completed the last playbook run can go back into the pool ready
+        # for promotion; recent cold boots may not have been provisioned yet.
+        provisioned = succeeded_hosts(task=PROVISIONED_TASK)
+        candidates = [server for server in active_servers if server.name in provisioned]
+        devservers_to_demote = min(devservers_to_remove, max(0, pool_size - len(warm_servers)), len(candidates))
+        demoted = demote_servers(conn, candidates[:devservers_to_demote])
+        warm_servers += demoted
+        devservers_to_remove -= len(demoted)
 
-        for server in existing_servers:
-            log(f"Checking server {server.name} for deletion criteria...")
-            if server.name.startswith(dev_server_prefix) and devservers_to_remove > 0:
-                log(f"Attempting to delete server {server.name}...")
-                try:
-                    conn.compute.delete_server(server.id)
-                    log(f"Server {server.name} deleted successfully.")
-                    devservers_to_remove -= 1
-                    existing_servers = list(conn.compute.servers(details=True))  # Refresh server list after deletion
-                except Exception as e:
-                    log(f"Failed to delete server {server.name}: {e}")
+        for server in [server for server in active_servers if server not in demoted]:
+            if devservers_to_remove == 0:
+                break
+            log(f"Attempting to delete server {server.name}...")
+            try:
+                conn.compute.delete_server(server.id)
+                log(f"Server {server.name} deleted successfully.")
+                devservers_to_remove -= 1
+            except Exception as e:
+                log(f"Failed to delete server {server.name}: {e}")
                 
     else:
         log(f"Required number of dev servers ({required_dev_servers}) already exist. No action needed.")
 
+    # Refill the pool; new members are provisioned by a background process
+    # started from the main loop, not by this cycle's playbook run.
+    missing = pool_size - len(warm_servers)
+    if missing > 0:
+        log(f"Refilling the warm pool with {missing} dev servers.")
+        names = allocate_names(dev_server_prefix, taken_names, missing)
+        metadata = dict(server_metadata(tag_name, 'devservers'), **{POOL_KEY: WARM})
+        boot_dev_servers(conn, tag_name, names, keypair_name, network, security_group, metadata)
+    return created_servers
+
+def wait_for_new_servers(conn, servers):
+    for server in servers:
+        log(f"Waiting for server {server.name} to become ACTIVE...")
+        try:
+            conn.compute.wait_for_server(server)
+        except Exception as e:
+            log(f"Server {server.name} did not become ACTIVE: {e}")
+
+def wait_for_ssh(tag_name, private_key, hosts, timeout=SSH_TIMEOUT):
+    targets = {host: ssh_args for host, ssh_args in inventory_targets(get_inventory(tag_name, private_key)).items() if host in hosts}
+    results = wait_for_hosts(targets, timeout)
+    return {host for host, elapsed in results.items() if elapsed is None}
+
+def new_hosts(inventory, ready_hosts):
+    # Hosts not seen reachable before, or whose address changed since
+    return [host for host, hostvars in inventory['_meta']['hostvars'].items()
+            if ready_hosts.get(host) != hostvars['ansible_host']]
 
 def generate_configs(tag_name, private_key):
     print("Generating Configuration files.")
@@ -93,10 +189,17 @@ def generate_configs(tag_name, private_key):
     print(output)
     return output
 
-def run_ansible_playbook():
+def run_ansible_playbook(exclude=()):
     print("Running Ansible playbook...")
-    ansible_command = "ansible-playbook -i hosts scripts/site.yaml"
-    subprocess.run(ansible_command, shell=True)
+    ansible_command = f"ansible-playbook -i {INVENTORY_SCRIPT} scripts/site.yaml"
+    if exclude:
+        log(f"Leaving {', '.join(sorted(exclude))} out of this run.")
+        ansible_command += f" --limit 'all{''.join(f':!{host}' for host in sorted(exclude))}'"
+    start = time.monotonic()
+    result = subprocess.run(ansible_command, shell=True)
+    log(f"Ansible playbook finished in {time.monotonic() - start:.1f}s.")
+    print_report()
+    return result.returncode
 
 
 if __name__ == "__main__":
@@ -107,22 +210,56 @@ if __name__ == "__main__":
     source_of_rcfile = sys.argv[1]
     tag_name = sys.argv[2]
     private_key = sys.argv[3]
+    # Read by the dynamic inventory in every ansible run started from here
+    os.environ['DEPLOY_TAG'] = tag_name
+    os.environ['DEPLOY_SSH_KEY'] = private_key
     conn = connect_to_openstack()
+    pool_stats = PoolStats()
+    # host -> address it was last reachable on over SSH
+    ready_hosts = {}
+    provisioner = None
     while True:
         try:
             required_dev_servers = read_required_servers('configurations/servers.conf')
         except FileNotFoundError:
             required_dev_servers = read_required_servers('scripts/servers.conf')
         log(f"Required number of dev servers: {required_dev_servers}")
+        pool_size = read_pool_size()
         
-        existing_servers = conn.compute.servers(details=True) 
         network, subnet, router, security_group, keypair_name = get_network_parameters(conn, tag_name)        
-        manage_dev_servers(conn, existing_servers, tag_name, keypair_name, network, security_group, required_dev_servers)
-        print ("Sleeping for 30 seconds.")
-        time.sleep(30)
+        # Listed under the lease so servers booted by a concurrent install
+        # or operate run are counted and never booted twice
+        try:
+            with scaling_lease(tag_name):
+                existing_servers = conn.compute.servers(details=True) 
+                created_servers = manage_dev_servers(conn, existing_servers, tag_name, keypair_name, network, security_group, required_dev_servers, pool_size, pool_stats)
+        except TimeoutError as e:
+            # Another run is still scaling; try again next cycle
+            log(f"{e}, skipping this cycle.")
+            time.sleep(30)
+            continue
+        wait_for_new_servers(conn, created_servers)
+        if created_servers:
+            print_placement_report(conn, tag_name)
+        invalidate_cache(tag_name)
         generate_configs(tag_name, private_key)
-        print("sleeping for 30 seconds...")        
-        time.sleep(30)
-        run_ansible_playbook()
+        for server in created_servers:
+            ready_hosts.pop(server.name, None)
+        # Unprovisioned pool members are handled by their own process and kept
+        # out of this cycle's SSH wait and playbook run
+        pool_members = unprovisioned_members(conn.compute.servers(details=True, name=f"^{tag_name}_dev"))
+        if pool_members and (provisioner is None or provisioner.poll() is not None):
+            provisioner = start_provisioning(pool_members)
+        inventory = get_inventory(tag_name, private_key)
+        probe = [host for host in new_hosts(inventory, ready_hosts) if host not in pool_members]
+        not_ready = wait_for_ssh(tag_name, private_key, probe)
+        for host in probe:
+            if host not in not_ready:
+                ready_hosts[host] = inventory['_meta']['hostvars'][host]['ansible_host']
+        push_changed_configs()
+        run_ansible_playbook(exclude=not_ready | set(pool_members))
+        # Judged per host, so an unrelated failure elsewhere in the run does
+        # not keep a provisioned member from becoming promotable
+        mark_provisioned(conn, tag_name, succeeded_hosts(task=PROVISIONED_TASK))
         log("Sleeping for 30 seconds...")
         time.sleep(30)
\ No newline at end of file
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+
+import os
+import re
+import sys
+import json
+import hashlib
+import datetime
+import subprocess
+import jinja2
+from inventory import GROUPS, INVENTORY_SCRIPT, in_rotation
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'configurations')
+RENDER_DIR = 'rendered'
+DEPLOYED_STATE = os.path.join(RENDER_DIR, 'deployed.json')
+
+# rendered file -> template, target hosts, remote path and the service to
+# restart or reload when the content changes
+CONFIGS = {
+    # HAProxy is reloaded rather than restarted so membership changes, such as
+    # a warm pool promotion, do not drop established connections.
+    'haproxy.cfg': {'template': 'haproxy.cfg.j2', 'hosts': 'main_proxy:standby_proxy', 'dest': '/etc/haproxy/haproxy.cfg', 'service': 'haproxy', 'state': 'reloaded'},
+    'nginx.conf': {'template': 'nginx.conf.j2', 'hosts': 'main_proxy:standby_proxy', 'dest': '/etc/nginx/nginx.conf', 'service': 'nginx', 'state': 'restarted'},
+    'prometheus.yml': {'template': 'prometheus.yml.j2', 'hosts': 'bastion', 'dest': '/etc/prometheus/prometheus.yml', 'service': 'prometheus', 'state': 'restarted'},
+    # Prometheus re-reads file_sd targets on its own, so these are written by
+    # gen_config and pushed without a restart.
+    'file_sd/node_exporter.json': {'template': None, 'hosts': 'bastion', 'dest': '/etc/prometheus/file_sd/node_exporter.json', 'service': None},
+    'file_sd/services.json': {'template': None, 'hosts': 'bastion', 'dest': '/etc/prometheus/file_sd/services.json', 'service': None},
+}
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{timestamp} {message}")
+
+def natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+def build_inventory(servers):
+    # Mirrors the groups and the hostvars the templates read from Ansible, so
+    # the same templates render without gathering facts from the hosts.
+    # servers come from inventory.list_servers(), so membership follows the
+    # same role metadata as the dynamic inventory.
+    groups = {group: [] for group in GROUPS}
+    hostvars = {}
+    for server in servers:
+        host = server['name']
+        groups[server['role']].append(host)
+        hostvars[host] = {
+            'inventory_hostname': host,
+            'ansible_host': server['floating_ip'] or server['internal_ip'],
+            'ansible_default_ipv4': {'address': server['internal_ip']},
+            'in_rotation': in_rotation(server['metadata']),
+        }
+    for group in GROUPS:
+        groups[group].sort(key=natural_key)
+    groups['all'] = [host for group in GROUPS for host in groups[group]]
+    return groups, hostvars
+
+def render(name, groups, hostvars):
+    # trim_blocks matches the Ansible template module, so output is byte for
+    # byte what the template task used to produce.
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR), trim_blocks=True,
+                             keep_trailing_newline=True, undefined=jinja2.StrictUndefined)
+    template = env.get_template(CONFIGS[name]['template'])
+    return template.render(groups=groups, hostvars=hostvars)
+
+def write_file_atomic(path, content):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def render_all(servers, out_dir=RENDER_DIR):
+    groups, hostvars = build_inventory(servers)
+    os.makedirs(out_dir, exist_ok=True)
+    rendered = {}
+    for name in CONFIGS:
+        if CONFIGS[name]['template'] is None:
+            continue
+        rendered[name] = render(name, groups, hostvars)
+        write_file_atomic(os.path.join(out_dir, name), rendered[name])
+    return rendered
+
+def content_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_deployed(state_file=DEPLOYED_STATE):
+    try:
+        with open(state_file, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_deployed(deployed, state_file=DEPLOYED_STATE):
+    write_file_atomic(state_file, json.dumps(deployed, indent=2, sort_keys=True) + "\n")
+
+def changed_configs(out_dir=RENDER_DIR, state_file=DEPLOYED_STATE):
+    deployed = load_deployed(state_file)
+    changed = []
+    for name in CONFIGS:
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path) and content_hash(path) != deployed.get(name):
+            changed.append(name)
+    return changed
+
+def mark_deployed(names, out_dir=RENDER_DIR, state_file=DEPLOYED_STATE):
+    deployed = load_deployed(state_file)
+    for name in names:
+        deployed[name] = content_hash(os.path.join(out_dir, name))
+    save_deployed(deployed, state_file)
+
+def run_ansible(hosts, module, args, inventory):
+    command = ["ansible", hosts, "-i", inventory, "-b", "-m", module, "-a", args]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        log(f"ansible {module} on {hosts} failed:\n{result.stdout.decode()}")
+    return result.returncode == 0
+
+def push_configs(names, out_dir=RENDER_DIR, inventory=INVENTORY_SCRIPT):
+    pushed = []
+    for name in names:
+        config = CONFIGS[name]
+        src = os.path.abspath(os.path.join(out_dir, name))
+        if not run_ansible(config['hosts'], 'copy', f"src={src} dest={config['dest']} mode=0644", inventory):
+            continue
+        if config['service'] and not run_ansible(config['hosts'], 'service', f"name={config['service']} state={config['state']}", inventory):
+            continue
+        log(f"Pushed {name} to {config['hosts']}.")
+        pushed.append(name)
+    mark_deployed(pushed, out_dir)
+    return pushed
+
+def push_changed_configs(out_dir=RENDER_DIR, inventory=INVENTORY_SCRIPT):
+    names = changed_configs(out_dir)
+    if not names:
+        log("Rendered configs match the deployed ones, nothing to push.")
+        return []
+    return push_configs(names, out_dir, inventory)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ('push', 'mark', 'status'):
+        print("Usage: render_configs.py <push|mark|status>")
+        sys.exit(1)
+    if sys.argv[1] == 'push':
+        push_changed_configs()
+    elif sys.argv[1] == 'mark':
+        mark_deployed([name for name in CONFIGS if os.path.exists(os.path.join(RENDER_DIR, name))])
+    else:
+        print("Changed since last deploy:", ", ".join(changed_configs()) or "none")
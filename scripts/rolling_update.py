@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+
+# Rolls service.py out to the dev nodes a batch at a time.
+#
+#   DEPLOY_TAG=<tag> DEPLOY_SSH_KEY=<key> rolling_update.py [--min-capacity 0.75] [--max-latency-ms 1000] [--max-error-rate 0.01]
+#
+# The batch size is the largest that keeps --min-capacity of the backends in
+# rotation. While the playbook runs, the VIP is measured in short windows so
+# the latency and error rate seen by clients during the rollout are reported;
+# a window whose p99 is above --max-latency-ms or whose error rate is above
+# --max-error-rate stops the rollout before the next batch is taken down.
+
+import sys
+import math
+import argparse
+import datetime
+import subprocess
+from inventory import INVENTORY_SCRIPT, get_inventory
+from loadgen import Results, default_url, format_report, percentile, run
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{timestamp} {message}", flush=True)
+
+def batch_size(node_count, min_capacity):
+    # At least one node per batch, otherwise a rollout could never progress
+    return max(1, math.floor(node_count * (1 - min_capacity)))
+
+def window_breach(results, max_latency_ms, max_error_rate):
+    latencies = sorted(results.latencies)
+    errors = sum(results.errors.values())
+    p99 = percentile(latencies, 99) * 1000
+    if p99 > max_latency_ms:
+        return f"p99 {p99:.1f}ms is above {max_latency_ms}ms"
+    if errors and errors / (len(latencies) + errors) > max_error_rate:
+        return f"error rate {errors / (len(latencies) + errors):.1%} is above {max_error_rate:.1%}"
+    return None
+
+def monitor(process, url, window, concurrency, max_latency_ms, max_error_rate):
+    windows = []
+    while process.poll() is None:
+        results, elapsed = run(url, 'closed', concurrency=concurrency, duration=window, timeout=window)
+        windows.append((results, elapsed))
+        latencies = sorted(results.latencies)
+        log(f"VIP: {len(latencies) / elapsed:.1f} req/s, p99 {percentile(latencies, 99) * 1000:.1f}ms, {sum(results.errors.values())} errors")
+        breach = window_breach(results, max_latency_ms, max_error_rate)
+        if breach and process.poll() is None:
+            log(f"Stopping the rollout: {breach}.")
+            process.terminate()
+            return windows, breach
+    return windows, None
+
+def rolling_update(min_capacity, max_latency_ms, drain_seconds, url=None, max_error_rate=0.01, window=5, concurrency=2):
+    nodes = get_inventory()['devservers']['hosts']
+    if not nodes:
+        log("No dev servers in the inventory, nothing to update.")
+        return 0
+    size = batch_size(len(nodes), min_capacity)
+    log(f"Updating {len(nodes)} dev servers in batches of {size}, keeping {len(nodes) - size} in rotation.")
+    if (len(nodes) - size) / len(nodes) < min_capacity:
+        # Batches never go below one node, so small pools dip under the target
+        log(f"Warning: a minimum capacity of {min_capacity:.0%} cannot be kept with {len(nodes)} dev servers, "
+            f"only {(len(nodes) - size) / len(nodes):.0%} stays in rotation during each batch.")
+    command = ["ansible-playbook", "-i", INVENTORY_SCRIPT, "scripts/site.yaml", "--limit", "devservers",
+               "-e", f"dev_batch_size={size}",
+               "-e", f"rolling_max_latency_ms={max_latency_ms}",
+               "-e", f"rolling_drain_seconds={drain_seconds}"]
+    process = subprocess.Popen(command)
+    windows, breach = monitor(process, url, window, concurrency, max_latency_ms, max_error_rate) if url else ([], None)
+    returncode = process.wait()
+    if windows:
+        combined = Results()
+        for results, _ in windows:
+            combined.latencies.extend(results.latencies)
+            for reason, count in results.errors.items():
+                combined.errors[reason] = combined.errors.get(reason, 0) + count
+            for backend, count in results.backends.items():
+                combined.backends[backend] = combined.backends.get(backend, 0) + count
+        print(format_report(combined, sum(elapsed for _, elapsed in windows), 'closed'))
+    if breach:
+        log(f"Rollout aborted by the VIP monitor: {breach}. Nodes of the interrupted batch may still be drained.")
+        return returncode or 1
+    if returncode != 0:
+        log("Rollout stopped: a batch failed its health or latency check.")
+    return returncode
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling update of the dev server application")
+    parser.add_argument('--min-capacity', type=float, default=0.75, help="fraction of dev servers kept in rotation")
+    parser.add_argument('--max-latency-ms', type=int, default=1000, help="health check latency a node must meet before it rejoins")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="fraction of failed VIP requests in a window that aborts the rollout")
+    parser.add_argument('--drain-seconds', type=int, default=5, help="time given to in-flight requests after draining a node")
+    parser.add_argument('--no-monitor', action='store_true', help="do not measure the VIP during the rollout")
+    args = parser.parse_args()
+    url = None
+    if not args.no_monitor:
+        try:
+            url = default_url()
+        except FileNotFoundError:
+            log("vip_address not found, rolling out without monitoring the VIP.")
+    sys.exit(rolling_update(args.min_capacity, args.max_latency_ms, args.drain_seconds, url, args.max_error_rate))
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+import sys
+import math
+import datetime
+
+# role -> scheduler policy. Dev nodes prefer separate hypervisors but may share
+# one when the cloud runs out of hosts; the keepalived pair must never share.
+GROUP_POLICIES = {
+    'devservers': 'soft-anti-affinity',
+    'proxies': 'anti-affinity',
+}
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{timestamp} {message}")
+
+def server_group_name(tag_name, role):
+    return f"{tag_name}_{role}_group"
+
+def ensure_server_group(conn, tag_name, role):
+    name = server_group_name(tag_name, role)
+    group = conn.compute.find_server_group(name)
+    if group:
+        return group
+    group = conn.compute.create_server_group(name=name, policies=[GROUP_POLICIES[role]])
+    log(f"Created server group {name} with policy {GROUP_POLICIES[role]}.")
+    return group
+
+def scheduler_hints(group):
+    return {'group': group.id}
+
+def delete_server_groups(conn, tag_name):
+    for role in GROUP_POLICIES:
+        name = server_group_name(tag_name, role)
+        group = conn.compute.find_server_group(name)
+        if group:
+            conn.compute.delete_server_group(group)
+            log(f"Removing server group {name}")
+
+def placement(servers):
+    # host_id is the per-project hash of the hypervisor Nova exposes to
+    # non-admin users, which is enough to tell whether two servers share one.
+    hosts = {}
+    for server in servers:
+        hosts.setdefault(server.host_id or 'unscheduled', []).append(server.name)
+    for names in hosts.values():
+        names.sort()
+    return hosts
+
+def format_placement(role, hosts):
+    scheduled = {host: names for host, names in hosts.items() if host != 'unscheduled'}
+    total = sum(len(names) for names in scheduled.values())
+    lines = [f"Placement of {role}: {total} servers on {len(scheduled)} hypervisors."]
+    for host, names in sorted(scheduled.items(), key=lambda item: (-len(item[1]), item[0])):
+        lines.append(f"  {host[:12]}: {len(names)} ({', '.join(names)})")
+    if 'unscheduled' in hosts:
+        lines.append(f"  not yet scheduled: {', '.join(hosts['unscheduled'])}")
+    if scheduled:
+        ideal = math.ceil(total / len(scheduled))
+        busiest = max(len(names) for names in scheduled.values())
+        if busiest > ideal:
+            lines.append(f"  uneven: {busiest} servers share one hypervisor, {ideal} would be even.")
+    return "\n".join(lines)
+
+def print_placement_report(conn, tag_name):
+    servers = list(conn.compute.servers(details=True, name=f"^{tag_name}_"))
+    by_role = {'devservers': [], 'proxies': []}
+    for server in servers:
+        role = (server.metadata or {}).get('role')
+        if role == 'devservers':
+            by_role['devservers'].append(server)
+        elif role in ('main_proxy', 'standby_proxy'):
+            by_role['proxies'].append(server)
+    for role, members in by_role.items():
+        print(format_placement(role, placement(members)))
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: server_groups.py <tag_name>")
+        sys.exit(1)
+    import openstack
+    print_placement_report(openstack.connect(), sys.argv[1])
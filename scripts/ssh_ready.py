@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import shlex
+import datetime
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from inventory import get_inventory
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{timestamp} {message}", flush=True)
+
+def inventory_targets(inventory):
+    # SSH arguments for every host, built from the same hostvars Ansible
+    # connects with. The ControlMaster/ControlPath settings in ~/.ssh/config
+    # then apply to the probe as well, so a successful probe leaves a
+    # persistent master socket behind for Ansible to reuse.
+    targets = {}
+    for host, hostvars in inventory['_meta']['hostvars'].items():
+        ssh_args = ["-i", os.path.expanduser(hostvars['ansible_ssh_private_key_file'])]
+        ssh_args += shlex.split(hostvars.get('ansible_ssh_common_args', ''))
+        ssh_args.append(f"{hostvars['ansible_user']}@{hostvars['ansible_host']}")
+        targets[host] = ssh_args
+    return targets
+
+def probe_host(ssh_args, connect_timeout=5):
+    # Output goes to DEVNULL because the backgrounded master would otherwise
+    # keep a captured pipe open and block the call.
+    command = ["ssh", "-o", "BatchMode=yes", "-o", "StrictHostKeyChecking=no", "-o", f"ConnectTimeout={connect_timeout}"] + ssh_args + ["true"]
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, timeout=connect_timeout * 3)
+    except subprocess.TimeoutExpired:
+        return False
+    return result.returncode == 0
+
+def wait_for_host(host, ssh_args, deadline, interval=3, connect_timeout=5):
+    start = time.monotonic()
+    attempts = 0
+    while True:
+        attempts += 1
+        if probe_host(ssh_args, connect_timeout):
+            elapsed = time.monotonic() - start
+            log(f"{host} accepts SSH after {elapsed:.1f}s ({attempts} attempts).")
+            return elapsed
+        if time.monotonic() + interval >= deadline:
+            log(f"{host} did not accept SSH within the timeout ({attempts} attempts).")
+            return None
+        time.sleep(interval)
+
+def wait_for_hosts(targets, timeout=600, interval=3, connect_timeout=5):
+    # Every host is probed in its own thread: the bastion directly, the rest
+    # through its ProxyJump, retrying until the jump host itself is reachable.
+    if not targets:
+        return {}
+    deadline = time.monotonic() + timeout
+    log(f"Waiting for SSH on {len(targets)} hosts: {', '.join(targets)}")
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        futures = {host: executor.submit(wait_for_host, host, ssh_args, deadline, interval, connect_timeout)
+                   for host, ssh_args in targets.items()}
+        results = {host: future.result() for host, future in futures.items()}
+    ready = [host for host, elapsed in results.items() if elapsed is not None]
+    log(f"{len(ready)}/{len(targets)} hosts ready.")
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print("Usage: DEPLOY_TAG=<tag> DEPLOY_SSH_KEY=<key> ssh_ready.py [timeout_seconds]")
+        sys.exit(1)
+    timeout = int(sys.argv[1]) if len(sys.argv) == 2 else 600
+    results = wait_for_hosts(inventory_targets(get_inventory()), timeout)
+    if any(elapsed is None for elapsed in results.values()):
+        sys.exit(1)
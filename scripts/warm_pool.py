@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+# Warm pool of dev servers that are booted and provisioned like any other dev
+# node but kept out of HAProxy rotation ('disabled' in haproxy.cfg). Pool
+# state lives in the server metadata:
+#
+#   pool=warm         member of the pool, not serving traffic
+#   provisioned=1     site.yaml has completed on it, so it can be promoted
+#
+# Promotion flips the metadata to pool=active and enables the server on both
+# HAProxy peers through the admin socket, which takes seconds instead of a
+# full boot and playbook run.
+#
+# New members are provisioned by a separate process (warm_pool.py provision)
+# that waits for SSH, runs site.yaml limited to them and marks the ones that
+# completed it, so operate's loop never waits on a refill.
+#
+#   DEPLOY_TAG=<tag> DEPLOY_SSH_KEY=<key> warm_pool.py provision <host>...
+
+import os
+import sys
+import time
+import datetime
+import subprocess
+from inventory import INVENTORY_SCRIPT, POOL_KEY, WARM, get_inventory, in_rotation
+from ssh_ready import inventory_targets, wait_for_hosts
+from ansible_report import succeeded_hosts
+
+PROVISIONED_KEY = 'provisioned'
+ACTIVE = 'active'
+# Last provisioning step of the devservers play in site.yaml
+PROVISIONED_TASK = 'wait for the app to answer health checks'
+# Kept apart from operate's ansible_timings.log, which is truncated by every
+# playbook run operate starts
+POOL_TIMINGS_LOG = 'warm_pool_timings.log'
+POOL_PROVISION_LOG = 'warm_pool_provision.log'
+POOL_SSH_TIMEOUT = 600
+
+def log(message):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{timestamp} {message}")
+
+def read_pool_size():
+    for file_path in ('configurations/warm_pool.conf', 'scripts/warm_pool.conf'):
+        try:
+            with open(file_path, 'r') as file:
+                return int(file.read().strip())
+        except FileNotFoundError:
+            continue
+    return 0
+
+def is_warm(server):
+    return not in_rotation(server.metadata or {})
+
+def is_ready(server):
+    return is_warm(server) and server.status == 'ACTIVE' and (server.metadata or {}).get(PROVISIONED_KEY) == '1'
+
+def haproxy_set_state(names, state, inventory=INVENTORY_SCRIPT):
+    # One socket round trip per proxy for the whole batch
+    commands = "; ".join(f"set server backendnodes/{name} state {state}" for name in names)
+    command = ["ansible", "main_proxy:standby_proxy", "-i", inventory, "-b", "-m", "shell",
+               "-a", f"echo '{commands}' | socat stdio /run/haproxy/admin.sock"]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        log(f"Setting {', '.join(names)} to {state} in HAProxy failed:\n{result.stdout.decode()}")
+    return result.returncode == 0
+
+class PoolStats:
+    def __init__(self):
+        self.promoted = 0
+        self.cold_boots = 0
+        self.promotion_seconds = []
+
+    def record_promotion(self, count, seconds):
+        self.promoted += count
+        self.promotion_seconds.append(seconds)
+
+    def record_cold_boots(self, count):
+        self.cold_boots += count
+
+    def report(self):
+        requested = self.promoted + self.cold_boots
+        if not requested:
+            return "Warm pool: no scale-ups yet."
+        hit_rate = self.promoted * 100 / requested
+        line = f"Warm pool: {self.promoted}/{requested} scale-up nodes served from the pool ({hit_rate:.0f}% hit rate)"
+        if self.promotion_seconds:
+            latencies = sorted(self.promotion_seconds)
+            line += f", promotion latency median {latencies[len(latencies) // 2]:.1f}s, max {latencies[-1]:.1f}s"
+        return line + "."
+
+def promote_servers(conn, servers, stats):
+    if not servers:
+        return []
+    start = time.monotonic()
+    for server in servers:
+        conn.compute.set_server_metadata(server, **{POOL_KEY: ACTIVE})
+    names = [server.name for server in servers]
+    # If the socket update fails the servers still join on the next config
+    # push, since haproxy.cfg is rendered from the metadata set above.
+    haproxy_set_state(names, 'ready')
+    elapsed = time.monotonic() - start
+    stats.record_promotion(len(servers), elapsed)
+    log(f"Promoted {', '.join(names)} from the warm pool in {elapsed:.1f}s.")
+    return servers
+
+def demote_servers(conn, servers):
+    # Callers pass only servers that completed site.yaml, so they are marked
+    # provisioned and can be promoted again straight away
+    if not servers:
+        return []
+    names = [server.name for server in servers]
+    haproxy_set_state(names, 'maint')
+    for server in servers:
+        conn.compute.set_server_metadata(server, **{POOL_KEY: WARM, PROVISIONED_KEY: '1'})
+    log(f"Moved {', '.join(names)} back into the warm pool.")
+    return servers
+
+def unprovisioned_members(servers):
+    return sorted(server.name for server in servers
+                  if is_warm(server) and server.status == 'ACTIVE' and (server.metadata or {}).get(PROVISIONED_KEY) != '1')
+
+def start_provisioning(names, log_file=POOL_PROVISION_LOG):
+    # Not waited on; the caller polls the returned process before starting another
+    log(f"Provisioning warm pool members {', '.join(names)} in the background (output in {log_file}).")
+    with open(log_file, 'a') as output:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), 'provision'] + list(names),
+                                stdout=output, stderr=subprocess.STDOUT)
+
+def provision_members(conn, tag_name, names, ssh_timeout=POOL_SSH_TIMEOUT):
+    targets = {host: ssh_args for host, ssh_args in inventory_targets(get_inventory(tag_name)).items() if host in names}
+    results = wait_for_hosts(targets, ssh_timeout)
+    ready = sorted(host for host, elapsed in results.items() if elapsed is not None)
+    if not ready:
+        log("No warm pool member accepts SSH yet.")
+        return 1
+    env = dict(os.environ, ANSIBLE_TASK_TIMER_LOG=POOL_TIMINGS_LOG)
+    result = subprocess.run(["ansible-playbook", "-i", INVENTORY_SCRIPT, "scripts/site.yaml", "--limit", ",".join(ready)], env=env)
+    mark_provisioned(conn, tag_name, succeeded_hosts(POOL_TIMINGS_LOG, task=PROVISIONED_TASK))
+    return result.returncode
+
+def mark_provisioned(conn, tag_name, host_names):
+    # Called after a playbook run with the hosts that completed it
+    for server in conn.compute.servers(details=True, name=f"^{tag_name}_dev"):
+        if server.name in host_names and is_warm(server) and not is_ready(server):
+            conn.compute.set_server_metadata(server, **{PROVISIONED_KEY: '1'})
+            log(f"Warm pool member {server.name} is provisioned and ready for promotion.")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != 'provision':
+        print("Usage: DEPLOY_TAG=<tag> DEPLOY_SSH_KEY=<key> warm_pool.py provision <host>...")
+        sys.exit(1)
+    import openstack
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.exit(provision_members(openstack.connect(), os.environ['DEPLOY_TAG'], sys.argv[2:]))
@@ -0,0 +1,33 @@
+from failover_probe import format_report, outage_window
+
+
+def probes(pattern, start=0.0, interval=0.5, backend='t_dev1'):
+    # One probe per character: '+' succeeded, '-' failed
+    return [(start + i * interval, mark == '+', backend if mark == '+' else 'refused')
+            for i, mark in enumerate(pattern)]
+
+
+def test_no_failure_after_trigger():
+    assert outage_window(probes('++++++'), 1.0) is None
+    assert "failover was not visible" in format_report(probes('++++++'), 1.0, 0.5)
+
+
+def test_failures_before_trigger_are_ignored():
+    assert outage_window(probes('-+++++'), 1.0) is None
+
+
+def test_failure_with_recovery():
+    # Trigger at 1.0s, failures at 1.5s, 2.0s and 2.5s, first success again at 3.0s
+    assert outage_window(probes('+++---+++'), 1.0) == (1.5, 2.5, 3.0, 3)
+    report = format_report(probes('+++---+++'), 1.0, 0.5)
+    assert "Outage window: 1.50s" in report
+    assert "3 failed probes" in report
+
+
+def test_intermittent_failures_recover_after_the_last_one():
+    assert outage_window(probes('++-+-++'), 0.5) == (1.0, 2.0, 2.5, 2)
+
+
+def test_still_failing_at_the_end():
+    assert outage_window(probes('++----'), 1.0) == (1.0, 2.5, None, 4)
+    assert "Still failing at the end of the run, outage lasted at least 1.50s." in format_report(probes('++----'), 1.0, 0.5)
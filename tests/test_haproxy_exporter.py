@@ -0,0 +1,113 @@
+import os
+import sys
+
+# The exporter is shipped to the proxies from configurations/, not scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'configurations'))
+
+import haproxy_exporter
+from haproxy_exporter import parse_info, parse_stat, split_output
+
+# Answer of "show info;show stat" recorded from a proxy with one dev server
+# in maintenance (trimmed to the columns up to ttime)
+PAYLOAD = """Name: HAProxy
+Version: 2.4.24-0ubuntu0.22.04.1
+Nbthread: 2
+Uptime_sec: 3600
+Maxconn: 4000
+CurrConns: 5
+CumReq: 1523
+ConnRate: 4
+SessRate: 4
+Run_queue: 1
+Idle_pct: 87
+node: t_HAproxy
+
+# pxname,svname,qcur,qmax,scur,smax,slim,stot,bin,bout,dreq,dresp,ereq,econ,eresp,wretr,wredis,status,weight,act,bck,chkfail,chkdown,lastchg,downtime,qlimit,pid,iid,sid,throttle,lbtot,tracked,type,rate,rate_lim,rate_max,check_status,check_code,check_duration,hrsp_1xx,hrsp_2xx,hrsp_3xx,hrsp_4xx,hrsp_5xx,hrsp_other,hanafail,req_rate,req_rate_max,req_tot,cli_abrt,srv_abrt,comp_in,comp_out,comp_byp,comp_rsp,lastsess,last_chk,last_agt,qtime,ctime,rtime,ttime,
+main,FRONTEND,,,3,12,2000,1520,204800,1048576,0,,2,,,,,OPEN,,,,,,,,,1,2,0,,,,0,4,0,25,,,,0,1500,0,12,8,0,,4,25,1520,,,0,0,0,0,,,,,,,,
+main,sock-1,,,0,0,2000,0,0,0,0,,0,,,,,OPEN,,,,,,,,,1,2,1,,,,3,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
+backendnodes,t_dev1,0,1,2,6,,760,102400,524288,,,,0,1,0,0,UP,1,1,0,0,0,310,0,,1,3,1,,760,,2,2,,12,L7OK,200,3,,750,,6,4,,,,,760,,,,,,,,,,0,1,12,25,
+backendnodes,t_dev2,0,0,0,4,,760,102400,524288,,,,2,0,1,1,MAINT,0,1,0,1,1,42,42,,1,3,2,,760,,2,0,,12,,,,,750,,6,4,,,,,760,,,,,,,,,,0,2,15,31,
+backendnodes,BACKEND,0,1,2,10,200,1520,204800,1048576,0,,,2,1,1,1,UP,1,1,0,,0,310,0,,1,3,0,,1520,,1,4,,25,,,,,1500,,12,8,,,,,1520,,,,,,,,,,0,1,13,28,
+
+"""
+
+
+def parse(payload=PAYLOAD):
+    samples = {}
+    info, stat = split_output(payload)
+    parse_info(info, samples)
+    parse_stat(stat, samples)
+    return samples
+
+
+def value(samples, name, labels=''):
+    return dict(samples[name])[labels]
+
+
+def test_split_output_separates_info_and_stat():
+    info, stat = split_output(PAYLOAD)
+    assert info.startswith("Name: HAProxy")
+    assert stat.startswith("# pxname,svname,")
+
+
+def test_info_fields_and_idle_ratio():
+    samples = parse()
+    assert value(samples, 'haproxy_process_uptime_seconds') == 3600
+    assert value(samples, 'haproxy_process_requests_total') == 1523
+    assert value(samples, 'haproxy_process_idle_ratio') == 0.87
+    # Fields without a metric are not exported
+    assert not any('nbthread' in name.lower() for name in samples)
+
+
+def test_millisecond_columns_are_seconds():
+    samples = parse()
+    dev1 = 'proxy="backendnodes",server="t_dev1"'
+    assert value(samples, 'haproxy_server_response_time_average_seconds', dev1) == 0.012
+    assert value(samples, 'haproxy_server_total_time_average_seconds', dev1) == 0.025
+    assert value(samples, 'haproxy_server_check_duration_seconds', dev1) == 0.003
+    assert value(samples, 'haproxy_backend_connect_time_average_seconds', 'proxy="backendnodes"') == 0.001
+    # Counters are passed through unchanged
+    assert value(samples, 'haproxy_frontend_http_requests_total', 'proxy="main"') == 1520
+
+
+def test_columns_only_for_their_proxy_types():
+    samples = parse()
+    # act is set on server rows too but only exported for backends
+    assert value(samples, 'haproxy_backend_active_servers', 'proxy="backendnodes"') == 1
+    assert 'haproxy_server_active_servers' not in samples
+    assert 'haproxy_frontend_queue_current' not in samples
+    assert 'haproxy_backend_request_errors_total' not in samples
+    # Empty fields (no check on t_dev2) are left out instead of exported as 0
+    assert [labels for labels, _ in samples['haproxy_server_check_duration_seconds']] == ['proxy="backendnodes",server="t_dev1"']
+
+
+def test_listeners_are_skipped():
+    samples = parse()
+    assert not any('sock-1' in labels for values in samples.values() for labels, _ in values)
+
+
+def test_up_follows_status():
+    samples = parse()
+    assert value(samples, 'haproxy_frontend_up', 'proxy="main"') == 1
+    assert value(samples, 'haproxy_backend_up', 'proxy="backendnodes"') == 1
+    assert value(samples, 'haproxy_server_up', 'proxy="backendnodes",server="t_dev1"') == 1
+    assert value(samples, 'haproxy_server_up', 'proxy="backendnodes",server="t_dev2"') == 0
+
+
+def test_collect_formats_the_scrape(monkeypatch):
+    monkeypatch.setattr(haproxy_exporter, 'query', lambda socket_path, command, timeout: PAYLOAD)
+    text = haproxy_exporter.collect('/run/haproxy/admin.sock', 1.0)
+    assert "# TYPE haproxy_server_up gauge\n" in text
+    assert 'haproxy_server_up{proxy="backendnodes",server="t_dev2"} 0\n' in text
+    assert 'haproxy_frontend_bytes_in_total{proxy="main"} 204800\n' in text
+    assert "haproxy_process_idle_ratio 0.87\n" in text
+    assert "haproxy_up 1\n" in text
+
+
+def test_collect_reports_socket_errors(monkeypatch):
+    def refuse(socket_path, command, timeout):
+        raise ConnectionRefusedError("connection refused")
+    monkeypatch.setattr(haproxy_exporter, 'query', refuse)
+    text = haproxy_exporter.collect('/run/haproxy/admin.sock', 1.0)
+    assert "haproxy_up 0\n" in text
+    assert "haproxy_server_up" not in text
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from lease import allocate_names, live_servers
+
+
+def server(name, status='ACTIVE', task_state=None):
+    return SimpleNamespace(name=name, status=status, task_state=task_state)
+
+
+def test_allocate_names_fills_gaps_first():
+    assert allocate_names('t_dev', ['t_dev1', 't_dev3', 't_dev4'], 3) == ['t_dev2', 't_dev5', 't_dev6']
+
+
+def test_allocate_names_starts_at_one():
+    assert allocate_names('t_dev', [], 2) == ['t_dev1', 't_dev2']
+
+
+def test_allocate_names_ignores_batch_and_foreign_names():
+    existing = ['t_dev1', 't_devbatch1-1', 't_devbatch1-2', 't_dev2x', 'other_dev2']
+    assert allocate_names('t_dev', existing, 2) == ['t_dev2', 't_dev3']
+
+
+def test_names_of_deleting_servers_stay_reserved():
+    # Callers take the names from the full listing and count only live servers
+    servers = [server('t_dev1'), server('t_dev2', task_state='deleting'), server('t_dev3', status='DELETED')]
+    taken = [s.name for s in servers]
+    assert [s.name for s in live_servers(servers)] == ['t_dev1']
+    assert allocate_names('t_dev', taken, 2) == ['t_dev4', 't_dev5']
+
+
+def test_live_servers_skips_deleted_and_deleting():
+    servers = [server('a'), server('b', status='DELETED'), server('c', task_state='deleting'),
+               server('d', status='BUILD', task_state='spawning')]
+    assert [s.name for s in live_servers(servers)] == ['a', 'd']
@@ -0,0 +1,64 @@
+import os
+
+from render_configs import build_inventory, changed_configs, mark_deployed, render_all
+
+
+def server(name, role, internal_ip, floating_ip=None, **metadata):
+    return {'name': name, 'role': role, 'internal_ip': internal_ip, 'floating_ip': floating_ip,
+            'metadata': dict(metadata, role=role)}
+
+
+SERVERS = [
+    server('devtag_bastion', 'bastion', '10.10.0.2', '192.0.2.10'),
+    server('devtag_HAproxy', 'main_proxy', '10.10.0.3', '192.0.2.11'),
+    server('devtag_HAproxy2', 'standby_proxy', '10.10.0.4', '192.0.2.12'),
+    server('devtag_dev10', 'devservers', '10.10.0.12'),
+    server('devtag_dev2', 'devservers', '10.10.0.6'),
+    server('devtag_dev1', 'devservers', '10.10.0.5', pool='warm'),
+]
+
+
+def test_build_inventory_groups_follow_role_metadata():
+    # The tag contains "dev", which must not pull the bastion or the proxies
+    # into the backend pool.
+    groups, hostvars = build_inventory(SERVERS)
+    assert groups['bastion'] == ['devtag_bastion']
+    assert groups['main_proxy'] == ['devtag_HAproxy']
+    assert groups['standby_proxy'] == ['devtag_HAproxy2']
+    assert groups['devservers'] == ['devtag_dev1', 'devtag_dev2', 'devtag_dev10']
+    assert groups['all'][:3] == ['devtag_bastion', 'devtag_HAproxy', 'devtag_HAproxy2']
+    assert hostvars['devtag_bastion']['ansible_host'] == '192.0.2.10'
+    assert hostvars['devtag_dev2']['ansible_host'] == '10.10.0.6'
+    assert hostvars['devtag_dev2']['ansible_default_ipv4']['address'] == '10.10.0.6'
+    assert hostvars['devtag_dev1']['in_rotation'] is False
+    assert hostvars['devtag_dev2']['in_rotation'] is True
+
+
+def test_render_all_is_deterministic(tmp_path):
+    first = render_all(SERVERS, out_dir=str(tmp_path / 'a'))
+    second = render_all(list(reversed(SERVERS)), out_dir=str(tmp_path / 'b'))
+    assert first == second
+    assert set(first) == {'haproxy.cfg', 'nginx.conf', 'prometheus.yml'}
+    for name, content in first.items():
+        assert (tmp_path / 'a' / name).read_text() == content
+
+
+def test_render_all_haproxy_backends(tmp_path):
+    haproxy = render_all(SERVERS, out_dir=str(tmp_path))['haproxy.cfg']
+    backends = [line.strip() for line in haproxy.splitlines() if line.strip().startswith('server ')]
+    assert backends == [
+        'server devtag_dev1 10.10.0.5:5000 check disabled',
+        'server devtag_dev2 10.10.0.6:5000 check',
+        'server devtag_dev10 10.10.0.12:5000 check',
+    ]
+
+
+def test_changed_configs_only_reports_new_content(tmp_path):
+    out_dir = str(tmp_path)
+    state_file = os.path.join(out_dir, 'deployed.json')
+    render_all(SERVERS, out_dir=out_dir)
+    assert changed_configs(out_dir, state_file) == ['haproxy.cfg', 'nginx.conf', 'prometheus.yml']
+    mark_deployed(['haproxy.cfg', 'nginx.conf', 'prometheus.yml'], out_dir, state_file)
+    assert changed_configs(out_dir, state_file) == []
+    render_all(SERVERS + [server('devtag_dev3', 'devservers', '10.10.0.7')], out_dir=out_dir)
+    assert changed_configs(out_dir, state_file) == ['haproxy.cfg', 'nginx.conf']
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+from server_groups import ensure_server_group, format_placement, placement, print_placement_report
+
+
+def server(name, host_id, role='devservers'):
+    return SimpleNamespace(name=name, host_id=host_id, metadata={'role': role})
+
+
+class FakeCompute:
+    def __init__(self, groups=(), servers=()):
+        self.groups = {group.name: group for group in groups}
+        self.servers_list = list(servers)
+        self.created = []
+
+    def find_server_group(self, name):
+        return self.groups.get(name)
+
+    def create_server_group(self, name, policies):
+        group = SimpleNamespace(name=name, id=f"id-{name}", policies=policies)
+        self.groups[name] = group
+        self.created.append(group)
+        return group
+
+    def servers(self, details=True, name=None):
+        return list(self.servers_list)
+
+
+def test_ensure_server_group_uses_role_policy():
+    compute = FakeCompute()
+    conn = SimpleNamespace(compute=compute)
+    devservers = ensure_server_group(conn, 't', 'devservers')
+    proxies = ensure_server_group(conn, 't', 'proxies')
+    assert devservers.name == 't_devservers_group'
+    assert devservers.policies == ['soft-anti-affinity']
+    assert proxies.policies == ['anti-affinity']
+
+
+def test_ensure_server_group_reuses_existing():
+    existing = SimpleNamespace(name='t_proxies_group', id='g1', policies=['anti-affinity'])
+    compute = FakeCompute(groups=[existing])
+    assert ensure_server_group(SimpleNamespace(compute=compute), 't', 'proxies') is existing
+    assert compute.created == []
+
+
+def test_placement_groups_by_host_and_marks_unscheduled():
+    hosts = placement([server('t_dev2', 'h1'), server('t_dev1', 'h1'), server('t_dev3', None)])
+    assert hosts == {'h1': ['t_dev1', 't_dev2'], 'unscheduled': ['t_dev3']}
+
+
+def test_format_placement_even_spread():
+    report = format_placement('devservers', placement([server('t_dev1', 'h1'), server('t_dev2', 'h2'), server('t_dev3', 'h3')]))
+    assert report.splitlines()[0] == "Placement of devservers: 3 servers on 3 hypervisors."
+    assert 'uneven' not in report
+
+
+def test_format_placement_uneven_spread():
+    report = format_placement('devservers', placement([server('t_dev1', 'h1'), server('t_dev2', 'h1'),
+                                                       server('t_dev3', 'h1'), server('t_dev4', 'h2')]))
+    assert "uneven: 3 servers share one hypervisor, 2 would be even." in report
+
+
+def test_format_placement_unscheduled_only():
+    report = format_placement('proxies', placement([server('t_HAproxy', '', 'main_proxy')]))
+    assert report.splitlines() == ["Placement of proxies: 0 servers on 0 hypervisors.",
+                                   "  not yet scheduled: t_HAproxy"]
+
+
+def test_print_placement_report_groups_by_role(capsys):
+    servers = [server('t_bastion', 'h1', 'bastion'), server('t_HAproxy', 'h1', 'main_proxy'),
+               server('t_HAproxy2', 'h1', 'standby_proxy'), server('t_dev1', 'h2')]
+    print_placement_report(SimpleNamespace(compute=FakeCompute(servers=servers)), 't')
+    out = capsys.readouterr().out
+    assert "Placement of devservers: 1 servers on 1 hypervisors." in out
+    assert "Placement of proxies: 2 servers on 1 hypervisors." in out
+    assert 't_bastion' not in out